@@ -2,10 +2,10 @@
 
 import os
 import sys
-from .hash import CRC32file
+from .hash import CRC32file, fingerprint
 
 # from .stream import TriadLogger
-from collections import namedtuple
+from collections import namedtuple, deque
 from tempfile import _RandomNameSequence
 
 import logging
@@ -15,40 +15,84 @@ logger = logging.getLogger(__name__)
 
 TrashEntry = namedtuple(
     "TrashEntry", 
-    field_names=["path", "crc", "orig_path"],
-    defaults=[None, None, None]
+    field_names=["path", "crc", "orig_path", "signature", "verify"],
+    defaults=[None, None, None, None, None]
 )
+ScanEntry = namedtuple(
+    "ScanEntry",
+    field_names=["path", "relpath", "depth", "is_dir", "is_symlink", "stat"]
+)
+
+
 class Trash(object):
 
     """Acts as a proxy for deleting files.
     Allows quick undos by delaying filesystem commits.
+
+    Trashed entries are indexed by path, and committed to the OS trash in batches
+    on a background spool, so large deletes stay linear.
+
+    Before a file is really deleted, the trash checks that it hasn't changed since it was
+    trashed, according to `verify`:
+    "stat" compares size, mtime and inode, without reading the file;
+    "sample" also compares a fingerprint of the file's start, middle and end;
+    "crc" compares a CRC32 of the whole file.
+
+    With a `journal` path, every trash, undo and commit is appended to that file as it happens.
+    A trash opened on the same journal after a crash picks up the queue where it left off,
+    including files renamed to `.trashed*` names, which can still be undone or restored.
     
     Attributes:
         queue_size (TYPE): Maximum length of the trash queue before committing disk operations
-        trash_queue (list): List of files to be deleted
+        batch_size (int): Maximum number of paths sent to the OS trash in one call
+        verify (str): How to check files for changes before deleting them: "stat", "sample" or "crc"
         verbose (bool): Print verbose output
+        hash_cache (HashCache): Digest cache for "crc" verification, if any
+        journal (str): Path to the journal file, if any
     """
     
-    def __init__(self, queue_size=20, verbose=False):
+    def __init__(self, queue_size=20, verbose=False, hash_cache=None, batch_size=256, verify="stat", journal=None):
         super().__init__()
 
+        if verify not in ("stat", "sample", "crc"):
+            raise ValueError(f"Unknown verify mode {verify!r}")
+
+        import threading
         from .loom import Spool
 
         self.randomname = _RandomNameSequence()
 
         self.verbose = verbose
         self.queue_size = queue_size
-
-        self.trash_queue = []
+        self.batch_size = batch_size
+        self.verify = verify
+        self.hash_cache = hash_cache
+        self.journal = journal
+
+        # Entries by path, and their order. Entries removed from the middle stay
+        # in the deque until they reach an end; `_entries` is authoritative.
+        self._entries = {}
+        self._order = deque()
+        # Committed paths waiting to be sent, the number of batches in flight, and
+        # the paths committed but not yet in the OS trash, pending or in flight
+        self._pending = []
+        self._sending = 0
+        self._committing = set()
+        self._pending_lock = threading.Lock()
         try:
             import send2trash
             self._osTrash = send2trash.send2trash
         except ImportError:
             logger.warning("send2trash unavailible, using unsafe delete")
-            self._osTrash = os.unlink
+            self._osTrash = _unlinkAll
 
         self._spool = Spool(4, "os trash")
 
+        self._journal_lock = threading.Lock()
+        self._journal_file = None
+        if journal:
+            self._replayJournal()
+
     def __enter__(self):
         return self
 
@@ -58,49 +102,234 @@ class Trash(object):
     def __str__(self):
         return str(self.trash_queue)
 
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def trash_queue(self):
+        """list: Entries waiting to be deleted, oldest first
+        """
+        return [entry for entry in self._order if self._entries.get(entry.path) is entry]
+
+    def _add(self, entry):
+        self._entries[entry.path] = entry
+        self._order.append(entry)
+        self._journalWrite("trash", entry)
+
+    def _discard(self, entry):
+        """Remove an entry from the queue, if present.
+
+        Returns:
+            bool: Whether it was present
+        """
+        if self._entries.get(entry.path) is entry:
+            del self._entries[entry.path]
+            return True
+        return False
+
+    def _popEntry(self, last=False):
+        """Remove and return the oldest (or newest) entry, skipping stale ones.
+        """
+        while self._order:
+            entry = self._order.pop() if last else self._order.popleft()
+            if self._discard(entry):
+                return entry
+        return None
+
     def enforceQueueSize(self):
-        while len(self.trash_queue) > self.queue_size:
-            self.commitDelete(self.trash_queue[0])
+        overflow = []
+        while len(self._entries) > self.queue_size:
+            overflow.append(self._popEntry())
+        if overflow:
+            self._commitBatch(overflow)
 
     def isfile(self, path):
-        if os.path.normpath(path) in [t[0] for t in self.trash_queue]:
+        path = os.path.normpath(path)
+        if path in self._entries or path in self._committing:
             return False
         else:
             return os.path.isfile(path)
 
-    def commitDelete(self, trashitem):
-        crc = trashitem.crc 
-        path = trashitem.path 
+    def _checkEntry(self, trashitem):
+        """Check that a trashed path can be sent to the OS trash.
 
-        if os.path.isdir(path):
-            crc = "DIRECTORY"
+        Returns:
+            bool: True if it still exists and is unchanged
+        """
+        path = trashitem.path
 
-            self._spool.enqueue(self._osTrash, args=(path,))
-            
-            if self.verbose:
-                logger.info("{} --> {} --> {}".format("[SNIPTRASH]", trashitem, "[OS TRASH]"))
+        if os.path.isdir(path):
+            return True
 
         elif os.path.isfile(path):
-            if not CRC32file(path) == crc:
+            if not self._signature(path, trashitem.verify) == trashitem.signature:
                 logger.warning("File changed. Not deleting file '%s'" % path)
-                return
-
-            self._spool.enqueue(self._osTrash, args=(path,))
-            
-            if self.verbose:
-                logger.info("{} --> {} --> {}".format("[SNIPTRASH]", trashitem, "[OS TRASH]"))
+                return False
+            return True
 
         else:
             logger.warning(f"deleted file '{path}' disappeared from disk")
-        
-        if trashitem in self.trash_queue:
-            self.trash_queue.remove(trashitem)
-        else:
-            logger.warning(f"deleted file '{path}' not in trash!")
+            return False
+
+    def _journalWrite(self, op, entry):
+        """Append an operation to the journal, and make sure it's on disk.
+
+        Args:
+            op (str): "trash", "undo", or "done" once the entry has left the trash for good
+            entry (TrashEntry): Entry operated on
+        """
+        if not self.journal:
+            return
+        import json
+        line = json.dumps({"op": op, "entry": entry._asdict()}) + "\n"
+        with self._journal_lock:
+            if self._journal_file is None:
+                self._journal_file = open(self.journal, "a", encoding="utf-8")
+            self._journal_file.write(line)
+            self._journal_file.flush()
+            os.fsync(self._journal_file.fileno())
+
+    def _replayJournal(self):
+        """Rebuild the queue from the journal, then rewrite the journal with just the live entries.
+        """
+        import json
+        if not os.path.isfile(self.journal):
+            return
+
+        entries = {}
+        with open(self.journal, "r", encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn write from a crash
+                    logger.warning(f"Skipping damaged trash journal line {line!r}")
+                    continue
+                entry = TrashEntry(**record["entry"])
+                if isinstance(entry.signature, list):
+                    entry = entry._replace(signature=tuple(entry.signature))
+                if record["op"] == "trash":
+                    entries[entry.path] = entry
+                else:
+                    entries.pop(entry.path, None)
+
+        for entry in entries.values():
+            if entry.orig_path and not os.path.exists(entry.path) and os.path.exists(entry.orig_path):
+                # Crashed before the rename happened
+                continue
+            if not os.path.exists(entry.path):
+                logger.warning(f"trashed file '{entry.path}' disappeared from disk")
+                continue
+            self._entries[entry.path] = entry
+            self._order.append(entry)
+
+        temp_path = self.journal + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as fp:
+            for entry in self._entries.values():
+                fp.write(json.dumps({"op": "trash", "entry": entry._asdict()}) + "\n")
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(temp_path, self.journal)
+
+    def _closeJournal(self):
+        with self._journal_lock:
+            if self._journal_file:
+                self._journal_file.close()
+                self._journal_file = None
+            if self.journal and not self._entries and os.path.isfile(self.journal):
+                os.unlink(self.journal)
+
+    def _signature(self, path, verify=None):
+        """Summarize a file's state, as far as `verify` cares.
+        Defaults to the trash's own verify mode.
+        """
+        verify = verify or self.verify
+        if verify == "crc":
+            return CRC32file(path, use_mmap=True, cache=self.hash_cache)
+        st = os.stat(path)
+        signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+        if verify == "sample":
+            # A fixed algorithm, so journaled signatures still match where xxhash isn't installed
+            signature += (fingerprint(path, algorithm="blake2b"),)
+        return signature
+
+    def _makeEntry(self, path, orig_path=None):
+        signature = self._signature(orig_path or path)
+        return TrashEntry(
+            path=path,
+            crc=signature if self.verify == "crc" else None,
+            orig_path=orig_path,
+            signature=signature,
+            verify=self.verify
+        )
+
+    def _commitBatch(self, entries):
+        """Commit already dequeued entries. They are sent to the OS trash on the spool
+        right away if it's idle, and otherwise when a full batch has built up or the
+        batch in flight finishes, so commits arriving together share a call.
+        """
+        checked = []
+        for trashitem in entries:
+            if self._checkEntry(trashitem):
+                checked.append(trashitem)
+                if self.verbose:
+                    logger.info("{} --> {} --> {}".format("[SNIPTRASH]", trashitem, "[OS TRASH]"))
+            else:
+                self._journalWrite("done", trashitem)
+
+        with self._pending_lock:
+            self._pending.extend(checked)
+            self._committing.update(trashitem.path for trashitem in checked)
+            while len(self._pending) >= self.batch_size:
+                self._sendPending(self.batch_size)
+            if not self._sending:
+                self._sendPending()
+
+    def _sendPending(self, count=None):
+        """Send up to `count` pending entries to the OS trash. Call with the pending lock held.
+        """
+        if count is None:
+            count = len(self._pending)
+        batch, self._pending = self._pending[:count], self._pending[count:]
+        if batch:
+            self._sending += 1
+            self._spool.enqueue(self._trashPaths, args=(batch,))
+
+    def _trashPaths(self, entries):
+        try:
+            try:
+                self._osTrash([entry.path for entry in entries])
+            except OSError:
+                # The call stops at the first bad path; retry the rest individually.
+                # Paths before it are already gone.
+                for entry in entries:
+                    if not os.path.lexists(entry.path):
+                        self._journalWrite("done", entry)
+                        continue
+                    try:
+                        self._osTrash([entry.path])
+                    except OSError:
+                        logger.error(f"Couldn't trash '{entry.path}'", exc_info=True)
+                        continue
+                    self._journalWrite("done", entry)
+            else:
+                for entry in entries:
+                    self._journalWrite("done", entry)
+        finally:
+            with self._pending_lock:
+                self._committing.difference_update(entry.path for entry in entries)
+                self._sending -= 1
+                # Whatever was committed meanwhile goes next
+                self._sendPending(self.batch_size)
+
+    def commitDelete(self, trashitem):
+        if not self._discard(trashitem):
+            logger.warning(f"deleted file '{trashitem.path}' not in trash!")
+        self._commitBatch([trashitem])
 
     def delete(self, path, rename=False):
         path = os.path.normpath(path)
-        if path in {item.path for item in self.trash_queue}:
+        if path in self._entries or path in self._committing:
             logger.warning(f"attempted to delete already trashed file '{path}'")
             return False
         elif os.path.isdir(path):
@@ -115,18 +344,18 @@ class Trash(object):
                 renamed_path = path + ".trashed" + next(self.randomname)
                 if not os.path.isfile(renamed_path):
                     break
-            moveFileToFile(path, renamed_path, clobber=False, quiet=not self.verbose)
-            entry = TrashEntry(
-                path=renamed_path,
-                crc=CRC32file(renamed_path),
-                orig_path=path
-            )
+            # Journal the entry before renaming, so a crash can't strand the renamed file.
+            entry = self._makeEntry(renamed_path, orig_path=path)
+            self._add(entry)
+            try:
+                moveFileToFile(path, renamed_path, clobber=False, quiet=not self.verbose)
+            except Exception:
+                self._discard(entry)
+                self._journalWrite("done", entry)
+                raise
         else:
-            entry = TrashEntry(
-                path=path,
-                crc=CRC32file(path)
-            )
-        self.trash_queue.append(entry)
+            entry = self._makeEntry(path)
+            self._add(entry)
         if self.verbose:
             logger.info("{} --> {}".format(entry, "[SNIPTRASH]"))
         self.enforceQueueSize()
@@ -134,7 +363,7 @@ class Trash(object):
 
     def deleteDir(self, path):
         path = os.path.normpath(path)
-        if path in {item.path for item in self.trash_queue}:
+        if path in self._entries or path in self._committing:
             logger.warning(f"attempted to delete already trashed directory '{path}'")
             return False
 
@@ -142,34 +371,744 @@ class Trash(object):
             path=path,
             crc="DIRECTORY"
         )
-        self.trash_queue.append(entry)
+        self._add(entry)
         if self.verbose:
             logger.info("{} --> {}".format(entry, "[SNIPTRASH]"))
         self.enforceQueueSize()
         return True
 
-    def undo(self):
-        if self.trash_queue:
-            entry = self.trash_queue.pop()
-            if self.verbose:
-                logger.info("{} <-- {}".format(entry, "[SNIPTRASH]"))
-            if entry.orig_path:
-                moveFileToFile(entry.path, entry.orig_path, clobber=False, quiet=not self.verbose)
-                return entry.orig_path
-            else:
-                return entry.path
-        else:
-            return False
+    def _restoreEntry(self, entry):
+        """Put back an entry that has already been removed from the queue.
+
+        Returns:
+            str: Restored path
+        """
+        if self.verbose:
+            logger.info("{} <-- {}".format(entry, "[SNIPTRASH]"))
+        if entry.orig_path:
+            moveFileToFile(entry.path, entry.orig_path, clobber=False, quiet=not self.verbose)
+        self._journalWrite("undo", entry)
+        return entry.orig_path or entry.path
+
+    def undo(self, n=None):
+        """Take back the most recent deletes.
+
+        Args:
+            n (int, optional): Number of deletes to undo
+
+        Returns:
+            The restored path, or False if there was nothing to undo.
+            If `n` is given, a list of restored paths, most recent first.
+        """
+        restored = []
+        for i in range(1 if n is None else n):
+            entry = self._popEntry(last=True)
+            if not entry:
+                break
+            restored.append(self._restoreEntry(entry))
+
+        if n is None:
+            return restored[0] if restored else False
+        return restored
+
+    def restore(self, pattern):
+        """Take back every queued delete of a path matching a glob pattern.
+
+        Args:
+            pattern (str): fnmatch-style pattern, matched against original paths
+
+        Returns:
+            list: Restored paths, oldest first
+        """
+        from fnmatch import fnmatch
+        return [
+            self._restoreEntry(entry)
+            for entry in self.trash_queue
+            if fnmatch(entry.orig_path or entry.path, pattern) and self._discard(entry)
+        ]
+
+    def sync(self):
+        """Send committed deletes to the OS trash, and wait for them to finish.
+        Entries still in the queue stay undoable.
+        """
+        with self._pending_lock:
+            self._sendPending()
+        self._spool.finish(resume=True)
 
     def flush(self):
         """Commit all trash operations
         """
-        for entry in self.trash_queue.copy():
-            self.commitDelete(entry)
+        entries = []
+        while self._entries:
+            entries.append(self._popEntry())
+        self._commitBatch(entries)
+        with self._pending_lock:
+            self._sendPending()
 
     def finish(self):
         self.flush()
         self._spool.finish()
+        self._closeJournal()
+
+
+def _unlinkAll(paths):
+    """Permanently delete files and directory trees. Stand-in for send2trash.
+    """
+    import shutil
+    for path in paths:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+
+
+def _matchesAny(relpath, name, patterns):
+    from fnmatch import fnmatch
+    # Patterns with a slash match the whole relative path, others just the name.
+    return any(fnmatch(relpath if "/" in pattern else name, pattern) for pattern in patterns)
+
+
+def _scanOne(directory, reldir, depth, include, exclude, max_depth, follow_symlinks, onerror=None):
+    """List one directory for scanTree.
+
+    Returns:
+        tuple: (entries to yield, (path, relpath) of subdirectories to descend into)
+    """
+    found = []
+    subdirs = []
+    try:
+        iterator = os.scandir(directory)
+    except OSError as e:
+        if onerror:
+            onerror(e)
+        else:
+            logger.warning(f"Can't scan directory '{directory}'", exc_info=True)
+        return found, subdirs
+    with iterator as entries:
+        for entry in entries:
+            relpath = reldir + "/" + entry.name if reldir else entry.name
+            if exclude and _matchesAny(relpath, entry.name, exclude):
+                continue
+            try:
+                is_symlink = entry.is_symlink()
+                is_dir = entry.is_dir(follow_symlinks=follow_symlinks)
+                try:
+                    st = entry.stat(follow_symlinks=follow_symlinks)
+                except FileNotFoundError:
+                    # Broken symlink
+                    st = entry.stat(follow_symlinks=False)
+            except OSError:
+                # Removed since listing
+                continue
+            if not include or _matchesAny(relpath, entry.name, include):
+                found.append(ScanEntry(entry.path, relpath, depth, is_dir, is_symlink, st))
+            if is_dir and (max_depth is None or depth < max_depth):
+                subdirs.append((entry.path, relpath, st))
+    return found, subdirs
+
+
+def scanTree(root, include=None, exclude=None, max_depth=None, follow_symlinks=False, workers=1, onerror=None):
+    """Recursively lists a directory with os.scandir, yielding each entry with its stat data.
+
+    Args:
+        root (str): Directory to scan
+        include (list, optional): Glob patterns; only matching entries are yielded,
+            though all directories are still searched
+        exclude (list, optional): Glob patterns; matching entries are skipped, and
+            matching directories aren't searched
+        max_depth (int, optional): Deepest level to list; 0 is just `root`'s own entries
+        follow_symlinks (bool, optional): Descend into symlinked directories, and stat link targets.
+            Each directory is visited once, even through several links.
+        workers (int, optional): Number of directories listed at once. Helps on network
+            filesystems, where each listing waits on a round trip. Changes the yield order.
+        onerror (callable, optional): Called with the OSError when a directory can't be listed,
+            as with os.walk. It may raise to stop the scan. By default, the error is logged
+            and the directory skipped.
+
+    Patterns without a "/" match entry names; patterns with one match the path relative to
+    `root`, with "/" separators. As with fnmatch, "*" matches across separators.
+
+    Yields:
+        ScanEntry: path, relpath, depth, is_dir, is_symlink and stat (an os.stat_result)
+    """
+    import concurrent.futures
+    from .loom import Spool
+
+    if isinstance(include, str):
+        include = [include]
+    if isinstance(exclude, str):
+        exclude = [exclude]
+
+    visited = set()
+
+    def shouldVisit(st):
+        if not follow_symlinks:
+            return True
+        key = (st.st_dev, st.st_ino)
+        if key in visited:
+            return False
+        visited.add(key)
+        return True
+
+    args = (include, exclude, max_depth, follow_symlinks, onerror)
+    shouldVisit(os.stat(root))
+
+    if workers <= 1:
+        stack = [(root, "", 0)]
+        while stack:
+            directory, reldir, depth = stack.pop()
+            found, subdirs = _scanOne(directory, reldir, depth, *args)
+            yield from found
+            for path, relpath, st in reversed(subdirs):
+                if shouldVisit(st):
+                    stack.append((path, relpath, depth + 1))
+        return
+
+    with Spool(workers, "scanTree", use_progbar=False) as spool:
+        pending = {spool.enqueue(_scanOne, (root, "", 0, *args)): 0}
+        try:
+            while pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    depth = pending.pop(future)
+                    found, subdirs = future.result()
+                    for path, relpath, st in subdirs:
+                        if shouldVisit(st):
+                            pending[spool.enqueue(_scanOne, (path, relpath, depth + 1, *args))] = depth + 1
+                    yield from found
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+IndexedFile = namedtuple(
+    "IndexedFile",
+    field_names=["size", "mtime_ns", "inode", "digest"],
+    defaults=[None]
+)
+IndexedDir = namedtuple(
+    "IndexedDir",
+    field_names=["mtime_ns", "subdirs", "files"]
+)
+TreeDiff = namedtuple(
+    "TreeDiff",
+    field_names=["added", "removed", "modified", "moved"]
+)
+
+
+class TreeIndex(object):
+
+    """A saved listing of a directory tree, which can tell what changed since it was taken.
+
+    Rescans only list directories whose mtime changed, since creating, deleting or renaming
+    an entry always touches its directory. Files in unchanged directories are just statted,
+    or, with `check_files=False`, assumed unchanged too.
+
+    Attributes:
+        root (str): Root directory
+        digest (str): Hash algorithm recorded for each file, or None for metadata only
+        files (dict): IndexedFile by "/"-separated path relative to root
+        dirs (dict): IndexedDir by "/"-separated path relative to root; "" is root itself
+    """
+
+    # Directories modified this recently might change again within the same mtime tick.
+    # Their listings aren't trusted on the next scan.
+    RACY_SECONDS = 2
+
+    def __init__(self, root, digest=None):
+        """Create an empty index. Call .scan to fill it.
+
+        Args:
+            root (str): Root directory
+            digest (str, optional): Algorithm name for file digests, as in hash.hashfile
+        """
+        super().__init__()
+        self.root = root
+        self.digest = digest
+        self.files = {}
+        self.dirs = {}
+
+    def __len__(self):
+        return len(self.files)
+
+    def abspath(self, relpath):
+        """Path of an indexed file or directory, from its key.
+        """
+        return os.path.join(self.root, *relpath.split("/")) if relpath else self.root
+
+    def _record(self, st, old):
+        """The IndexedFile for a stat, reusing the old one (and its digest) if nothing changed.
+        """
+        if old and (old.size, old.mtime_ns, old.inode) == (st.st_size, st.st_mtime_ns, st.st_ino):
+            return old
+        return IndexedFile(st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def scan(self, check_files=True, workers=None):
+        """Bring the index up to date with the disk.
+
+        Args:
+            check_files (bool, optional): Stat files in unchanged directories to catch
+                modifications. Without this, only added, removed and moved files are found.
+            workers (int, optional): Number of files hashed at once, if recording digests
+
+        Returns:
+            TreeDiff: Sorted lists of added, removed and modified paths, and of
+            (old path, new path) pairs for moved files, all relative to root
+        """
+        import stat
+        import time
+        from .hash import hashfiles
+
+        now_ns = time.time_ns()
+        new_files = {}
+        new_dirs = {}
+        stack = [""]
+        while stack:
+            reldir = stack.pop()
+            prefix = reldir + "/" if reldir else ""
+            try:
+                st = os.stat(self.abspath(reldir))
+            except FileNotFoundError:
+                continue
+            old = self.dirs.get(reldir)
+
+            if old and old.mtime_ns == st.st_mtime_ns:
+                subdirs, files = old.subdirs, old.files
+                for name in files:
+                    relpath = prefix + name
+                    if check_files:
+                        try:
+                            new_files[relpath] = self._record(os.stat(self.abspath(relpath)), self.files.get(relpath))
+                        except FileNotFoundError:
+                            pass
+                    elif relpath in self.files:
+                        new_files[relpath] = self.files[relpath]
+            else:
+                subdirs, files = [], []
+                found, _ = _scanOne(self.abspath(reldir), reldir, 0, None, None, 0, False, _raise)
+                for entry in found:
+                    name = os.path.basename(entry.path)
+                    if entry.is_dir:
+                        subdirs.append(name)
+                    elif stat.S_ISREG(entry.stat.st_mode):
+                        files.append(name)
+                        new_files[entry.relpath] = self._record(entry.stat, self.files.get(entry.relpath))
+
+            mtime_ns = st.st_mtime_ns
+            if now_ns - mtime_ns < self.RACY_SECONDS * 1e9:
+                mtime_ns = -1
+            new_dirs[reldir] = IndexedDir(mtime_ns, tuple(subdirs), tuple(files))
+            stack.extend(prefix + name for name in subdirs)
+
+        added = set(new_files) - set(self.files)
+        removed = set(self.files) - set(new_files)
+        modified = {
+            relpath for relpath in set(new_files) & set(self.files)
+            if new_files[relpath] is not self.files[relpath]
+        }
+
+        if self.digest:
+            to_hash = {self.abspath(relpath): relpath for relpath in added | modified}
+            for path, digest in hashfiles(list(to_hash), self.digest, workers=workers):
+                relpath = to_hash[path]
+                new_files[relpath] = new_files[relpath]._replace(digest=digest)
+
+        # Renames keep the inode and mtime; copies followed by deletes keep the digest.
+        # Inodes are reused as soon as they're freed, so an inode alone doesn't make a move.
+        keys = [lambda file: file.inode is not None and (file.inode, file.size, file.mtime_ns, file.digest)]
+        if self.digest:
+            keys.append(lambda file: file.digest is not None and (file.digest, file.size))
+        moved = []
+        for key in keys:
+            by_key = {}
+            for relpath in removed:
+                old_key = key(self.files[relpath])
+                if old_key:
+                    by_key.setdefault(old_key, relpath)
+            for relpath in sorted(added):
+                new_key = key(new_files[relpath])
+                old_relpath = by_key.pop(new_key, None) if new_key else None
+                if old_relpath:
+                    moved.append((old_relpath, relpath))
+                    removed.discard(old_relpath)
+                    added.discard(relpath)
+
+        self.files = new_files
+        self.dirs = new_dirs
+        return TreeDiff(sorted(added), sorted(removed), sorted(modified), sorted(moved))
+
+    def save(self, path):
+        """Write the index to a JSON file, atomically.
+
+        Args:
+            path (str): Path to index file
+        """
+        import json
+        data = {
+            "root": self.root,
+            "digest": self.digest,
+            "dirs": {relpath: list(record) for relpath, record in self.dirs.items()},
+            "files": {relpath: list(record) for relpath, record in self.files.items()},
+        }
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as fp:
+            json.dump(data, fp, separators=(",", ":"))
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by .save.
+
+        Args:
+            path (str): Path to index file
+
+        Returns:
+            TreeIndex: The index
+        """
+        import json
+        with open(path, "r", encoding="utf-8") as fp:
+            data = json.load(fp)
+        index = cls(data["root"], digest=data["digest"])
+        index.dirs = {
+            relpath: IndexedDir(mtime_ns, tuple(subdirs), tuple(files))
+            for relpath, (mtime_ns, subdirs, files) in data["dirs"].items()
+        }
+        index.files = {relpath: IndexedFile(*record) for relpath, record in data["files"].items()}
+        return index
+
+
+WatchEvent = namedtuple(
+    "WatchEvent",
+    field_names=["kind", "path", "dest_path"],
+    defaults=[None]
+)
+
+
+class _Inotify(object):
+
+    """Minimal ctypes binding to Linux inotify.
+    """
+
+    IN_MODIFY = 0x2
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def addWatch(self, path):
+        """Returns:
+            int: Watch descriptor, or -1 if the directory couldn't be watched
+        """
+        return self._libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+
+    def removeWatch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self):
+        """Read available events.
+
+        Returns:
+            list: (wd, mask, cookie, name) tuples
+        """
+        import struct
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = struct.unpack_from("iIII", data, offset)
+            offset += 16
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Watcher(object):
+
+    """Watches a directory tree and reports changes to its files in debounced batches.
+
+    Uses inotify on Linux, and polls with a TreeIndex elsewhere, or if inotify is unavailable.
+    Events arriving within `debounce` seconds of each other are coalesced per path before
+    `callback` is called with them, on the watcher's thread: a file created then modified
+    is just "created", created then deleted is nothing, and so on.
+
+    Event kinds are "created", "modified", "deleted", "moved" (with `dest_path`),
+    and "overflow", meaning events were lost and everything under `path` should be rechecked.
+
+    Attributes:
+        root (str): Watched directory
+        callback (function): Called with a list of WatchEvents
+        debounce (float): Seconds of quiet before a batch of events is delivered
+        poll_interval (float): Seconds between scans, when polling
+        backend (str): "inotify" or "poll"
+    """
+
+    def __init__(self, root, callback, debounce=0.2, poll_interval=1.0, use_inotify=None):
+        """Create a watcher. Call .start, or use it as a context manager, to begin watching.
+
+        Args:
+            root (str): Directory to watch, recursively
+            callback (function): Called with a list of WatchEvents
+            debounce (float, optional): Seconds of quiet before a batch of events is delivered
+            poll_interval (float, optional): Seconds between scans, when polling
+            use_inotify (bool, optional): Force inotify on or off. Defaults to using it where available.
+        """
+        super().__init__()
+        import threading
+
+        self.root = root
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+
+        self._inotify = None
+        if use_inotify is not False and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError):
+                if use_inotify:
+                    raise
+                logger.warning("inotify unavailable, polling for changes", exc_info=True)
+        self.backend = "inotify" if self._inotify else "poll"
+
+        # Pending events by path, in arrival order
+        self._pending = {}
+        self._last_event = self._first_event = 0
+        # inotify watch descriptors to directories, and unmatched IN_MOVED_FROM paths by cookie
+        self._watches = {}
+        self._moves = {}
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    def start(self):
+        """Begin watching in a background thread.
+        """
+        import threading
+        self._stopping.clear()
+        if self.backend == "inotify":
+            if self._inotify is None:
+                # Restarting after .stop
+                self._inotify = _Inotify()
+            # Set up watches before returning, so no changes after .start are missed.
+            self._watchTree(self.root)
+            target = self._inotifyLoop
+        else:
+            self._index = TreeIndex(self.root)
+            self._index.scan()
+            target = self._pollLoop
+        self._thread = threading.Thread(target=target, name=f"Watcher {self.root}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching, delivering any pending events first.
+        """
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+        self._watches.clear()
+        self._moves.clear()
+
+    def _push(self, kind, path, dest_path=None):
+        """Record an event, coalescing it with what's already pending for the same path.
+        """
+        pending = self._pending
+        self._touch()
+
+        if kind == "moved":
+            previous = pending.pop(path, None)
+            if previous and previous.kind == "created":
+                kind, path, dest_path = "created", dest_path, None
+            elif previous and previous.kind == "moved":
+                # Moved twice; report the overall move
+                path = previous.path
+            key = dest_path or path
+            pending.pop(key, None)
+            pending[key] = WatchEvent(kind, path, dest_path)
+            return
+
+        previous = pending.pop(path, None)
+        if previous is None:
+            pending[path] = WatchEvent(kind, path)
+        elif kind == "created":
+            # Replaced: deleted then created again
+            pending[path] = WatchEvent("modified" if previous.kind == "deleted" else previous.kind, previous.path, previous.dest_path)
+        elif kind == "modified":
+            pending[path] = previous if previous.kind in ("created", "moved") else WatchEvent("modified", path)
+        elif kind == "deleted":
+            if previous.kind == "moved":
+                pending[previous.path] = WatchEvent("deleted", previous.path)
+            elif previous.kind != "created":
+                pending[path] = WatchEvent("deleted", path)
+        else:
+            pending[path] = WatchEvent(kind, path)
+
+    def _touch(self):
+        """Note that an event arrived, for debouncing.
+        """
+        import time
+        now = time.monotonic()
+        if not self._pending and not self._moves:
+            self._first_event = now
+        self._last_event = now
+
+    def _flushDue(self):
+        """Deliver pending events if things have been quiet for `debounce` seconds,
+        or if events have been arriving nonstop for ten times that.
+
+        Returns:
+            float: Seconds until the next flush could be due, or None if nothing is pending
+        """
+        import time
+        if not self._pending and not self._moves:
+            return None
+        now = time.monotonic()
+        due = min(self._last_event + self.debounce, self._first_event + self.debounce * 10)
+        if now < due:
+            return due - now
+        self._flush()
+        return None
+
+    def _flush(self):
+        # Moves whose other half never arrived went in or out of the tree.
+        for cookie, path in self._moves.items():
+            self._push("deleted", path)
+            self._unwatchTree(path)
+        self._moves.clear()
+        if not self._pending:
+            return
+        events = list(self._pending.values())
+        self._pending.clear()
+        try:
+            self.callback(events)
+        except Exception:
+            logger.error("Watcher callback failed", exc_info=True)
+
+    def _watchTree(self, path, report=False):
+        """Add inotify watches for a directory and everything in it.
+
+        Args:
+            path (str): Directory
+            report (bool, optional): Report everything inside as created. For new directories,
+                whose contents may have appeared before the watches did.
+        """
+        directories = [path]
+        for entry in scanTree(path):
+            if entry.is_dir:
+                directories.append(entry.path)
+            if report:
+                self._push("created", entry.path)
+        for directory in directories:
+            wd = self._inotify.addWatch(directory)
+            if wd >= 0:
+                self._watches[wd] = directory
+
+    def _unwatchTree(self, path):
+        prefix = path + os.sep
+        for wd, directory in list(self._watches.items()):
+            if directory == path or directory.startswith(prefix):
+                self._inotify.removeWatch(wd)
+                del self._watches[wd]
+
+    def _inotifyLoop(self):
+        import select
+        ino = self._inotify
+        while not self._stopping.is_set():
+            timeout = self._flushDue()
+            readable, _, _ = select.select([ino.fd], [], [], min(timeout or 0.5, 0.5))
+            if not readable:
+                continue
+            for wd, mask, cookie, name in ino.read():
+                if mask & ino.IN_Q_OVERFLOW:
+                    self._push("overflow", self.root)
+                    continue
+                if mask & ino.IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, name) if name else directory
+                is_dir = mask & ino.IN_ISDIR
+
+                if mask & ino.IN_MOVED_FROM:
+                    # Held until its IN_MOVED_TO, or reported as deleted at the next flush
+                    self._touch()
+                    self._moves[cookie] = path
+                elif mask & ino.IN_MOVED_TO:
+                    source = self._moves.pop(cookie, None)
+                    if source is None:
+                        self._push("created", path)
+                        if is_dir:
+                            self._watchTree(path, report=True)
+                    else:
+                        self._push("moved", source, path)
+                        if is_dir:
+                            # Watches follow the directory; only our names for them change.
+                            prefix = source + os.sep
+                            for watch, watched in self._watches.items():
+                                if watched == source or watched.startswith(prefix):
+                                    self._watches[watch] = path + watched[len(source):]
+                elif mask & ino.IN_CREATE:
+                    self._push("created", path)
+                    if is_dir:
+                        self._watchTree(path, report=True)
+                elif mask & ino.IN_DELETE:
+                    self._push("deleted", path)
+                elif mask & (ino.IN_MODIFY | ino.IN_CLOSE_WRITE) and not is_dir:
+                    self._push("modified", path)
+        self._flush()
+
+    def _pollLoop(self):
+        while not self._stopping.wait(self.poll_interval):
+            diff = self._index.scan()
+            for relpath in diff.added:
+                self._push("created", self._index.abspath(relpath))
+            for relpath in diff.removed:
+                self._push("deleted", self._index.abspath(relpath))
+            for relpath in diff.modified:
+                self._push("modified", self._index.abspath(relpath))
+            for source, dest in diff.moved:
+                self._push("moved", self._index.abspath(source), self._index.abspath(dest))
+            # Polling already batches; no need to wait for quiet.
+            self._flush()
+        self._flush()
 
 
 def easySlug(string, repl="-", directory=False):
@@ -252,6 +1191,71 @@ def opDirWithMerge(op, source, destination, clobber, quiet):
     _safetyChecks(yfolders=[source], nfolders=nfolders)
     return _doFileOp(op, source, destination, quiet)
 
+def opFilesToDir(op, sources, destination, clobber, quiet, workers=1, count_same_device=True):
+    """Runs `op` on many files going into one directory, checking everything first:
+    each source is statted once, the destination is listed once for clobber detection,
+    and free space is checked once against the total size.
+
+    Args:
+        op (function): Called with (source, destination file path)
+        sources (iterable): Source file paths
+        destination (str): Destination directory
+        clobber (bool): Overwrite existing files, instead of raising FileExistsError
+        quiet (bool): Don't log each operation
+        workers (int, optional): Number of operations run at once
+        count_same_device (bool, optional): Whether files on the destination's device
+            take up new space. False for moves, which are renames there.
+
+    Returns:
+        list: Destination paths
+    """
+    import shutil
+    import stat
+    from os import path
+    from .loom import Spool
+
+    if not path.isdir(destination):
+        raise FileNotFoundError(destination)
+    dest_dev = os.stat(destination).st_dev
+
+    jobs = []
+    names = set()
+    total_size = 0
+    for source in sources:
+        try:
+            st = os.stat(source)
+        except FileNotFoundError:
+            raise FileNotFoundError(source) from None
+        if not stat.S_ISREG(st.st_mode):
+            raise FileNotFoundError(source)
+        name = path.basename(source)
+        if name in names and not clobber:
+            raise FileExistsError(path.join(destination, name))
+        names.add(name)
+        if count_same_device or st.st_dev != dest_dev:
+            total_size += st.st_size
+        jobs.append((source, path.join(destination, name)))
+
+    if not clobber:
+        with os.scandir(destination) as entries:
+            for entry in entries:
+                if entry.name in names and entry.is_file():
+                    raise FileExistsError(entry.path)
+
+    if total_size and shutil.disk_usage(destination).free <= total_size:
+        raise OSError("Not enough space for operation!")
+
+    if workers > 1:
+        with Spool(workers, "opFilesToDir", use_progbar=not quiet) as spool:
+            futures = [spool.enqueue(_doFileOp, (op, source, target, quiet)) for source, target in jobs]
+        for future in futures:
+            future.result()
+    else:
+        for source, target in jobs:
+            _doFileOp(op, source, target, quiet)
+    return [target for source, target in jobs]
+
+
 def _pathsExistCheck(source_file, destination_dir):
     """Raises an error if source_file is bigger than destination_dir's free space
     
@@ -309,8 +1313,23 @@ def copyFileToDir(source: str, destination: str, clobber=False, quiet=False):
     Returns:
         str: Destination path
     """
-    import shutil
-    return opFileToDir(shutil.copy2, source, destination, clobber, quiet)
+    return opFileToDir(copyFile, source, destination, clobber, quiet)
+
+
+def copyFilesToDir(sources, destination: str, clobber=False, quiet=False, workers=1):
+    """Copies files `sources` to folder `destination`, checking them all before copying any.
+
+    Args:
+        sources (iterable): Source paths
+        destination (str): Destination path
+        clobber (bool, optional): Error instead of overwriting existing files.
+        quiet (bool, optional): Print progress to screen
+        workers (int, optional): Number of files copied at once
+
+    Returns:
+        list: Destination paths
+    """
+    return opFilesToDir(copyFile, sources, destination, clobber, quiet, workers=workers)
 
 
 def copyFileToFile(source: str, destination: str, clobber=False, quiet=False):
@@ -325,8 +1344,7 @@ def copyFileToFile(source: str, destination: str, clobber=False, quiet=False):
     Returns:
         str: Destination path
     """
-    import shutil
-    return opFileToFile(shutil.copy2, source, destination, clobber, quiet)
+    return opFileToFile(copyFile, source, destination, clobber, quiet)
 
 
 def copyDirToParent(source: str, destination: str, clobber=False, quiet=False):
@@ -357,22 +1375,216 @@ def copyDirWithMerge(source: str, destination: str, clobber=False, quiet=False):
     Returns:
         list: Destination paths
     """
-    from distutils.dir_util import copy_tree
-    return opDirWithMerge(copy_tree, source, destination, clobber, quiet)
+    from functools import partial
+    return opDirWithMerge(partial(transferTree, quiet=quiet), source, destination, clobber, quiet)
+
+
+def _reflinkCopy(src_fd, dst_fd, size):
+    import fcntl
+    FICLONE = 0x40049409
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+
+
+def _copyFileRangeCopy(src_fd, dst_fd, size):
+    while os.copy_file_range(src_fd, dst_fd, 1024 * 1024 * 1024):
+        pass
+
+
+def _sendfileCopy(src_fd, dst_fd, size):
+    offset = 0
+    while True:
+        sent = os.sendfile(dst_fd, src_fd, offset, 1024 * 1024 * 1024)
+        if not sent:
+            break
+        offset += sent
+
+
+def _bufferedCopy(src_fd, dst_fd, size):
+    import shutil
+    with open(src_fd, "rb", closefd=False) as src, open(dst_fd, "wb", closefd=False) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
 
 
-def _copyTreeAndRemove(source: str, destination: str):
-    """Summary
+# Fastest first. Each raises OSError if the kernel or filesystem can't do it.
+_COPY_METHODS = [
+    method for method, available in [
+        (_reflinkCopy, sys.platform.startswith("linux")),
+        (_copyFileRangeCopy, hasattr(os, "copy_file_range")),
+        (_sendfileCopy, hasattr(os, "sendfile") and sys.platform.startswith("linux")),
+        (_bufferedCopy, True),
+    ] if available
+]
+
+# (source device, destination device): index of the first method that worked there
+_copy_method_cache = {}
+
+
+def copyFile(source: str, destination: str, follow_symlinks=True):
+    """Copies file `source` to `destination`, with its metadata, like shutil.copy2,
+    but without passing the data through Python where the OS can help.
+
+    Tries, in order, a reflink (instant on copy-on-write filesystems like btrfs and XFS),
+    copy_file_range, sendfile, and finally a buffered copy. Which one works is remembered
+    for each pair of devices, so only the first copy between them pays for the probing.
 
     Args:
-        source (TYPE): Description
-        destination (TYPE): Description
+        source (str): Source path
+        destination (str): Destination path, or directory to copy into
+        follow_symlinks (bool, optional): If False, symlinks are copied as links
+
+    Returns:
+        str: Destination path
     """
-    from distutils.dir_util import copy_tree
-    import os
-    result = copy_tree(source, destination)
-    os.unlink(source)
-    return result
+    import errno
+    import shutil
+    if os.path.isdir(destination):
+        destination = os.path.join(destination, os.path.basename(source))
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        # Opening the destination for writing would truncate the source.
+        raise shutil.SameFileError(f"{source!r} and {destination!r} are the same file")
+
+    if not follow_symlinks and os.path.islink(source):
+        if os.path.lexists(destination):
+            os.unlink(destination)
+        os.symlink(os.readlink(source), destination)
+        shutil.copystat(source, destination, follow_symlinks=False)
+        return destination
+
+    unsupported = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL, errno.ENOTTY, errno.EBADF, errno.EPERM}
+    unsupported.add(getattr(errno, "ENOTSUP", errno.EOPNOTSUPP))
+    unsupported.add(getattr(errno, "ENOTSOCK", errno.EOPNOTSUPP))
+
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        src_fd, dst_fd = src.fileno(), dst.fileno()
+        src_st, dst_st = os.fstat(src_fd), os.fstat(dst_fd)
+        devices = (src_st.st_dev, dst_st.st_dev)
+        for i in range(_copy_method_cache.get(devices, 0), len(_COPY_METHODS)):
+            try:
+                _COPY_METHODS[i](src_fd, dst_fd, src_st.st_size)
+            except OSError as e:
+                if e.errno not in unsupported or i == len(_COPY_METHODS) - 1:
+                    raise
+                # Start over cleanly with the next method.
+                os.lseek(src_fd, 0, os.SEEK_SET)
+                os.lseek(dst_fd, 0, os.SEEK_SET)
+                os.ftruncate(dst_fd, 0)
+                continue
+            _copy_method_cache[devices] = i
+            break
+
+    shutil.copystat(source, destination)
+    return destination
+
+
+def _raise(e):
+    raise e
+
+
+def _pairTree(source: str, destination: str):
+    """Scan a tree, pairing each entry with its place under `destination`.
+    Unlike scanTree, a directory that can't be listed is an error.
+
+    Returns:
+        tuple: (directories, files), lists of (source, destination) pairs. Files carry
+        their size as a third item. Directories are listed parents first.
+    """
+    directories = [(source, destination)]
+    files = []
+    for entry in scanTree(source, onerror=_raise):
+        target = os.path.join(destination, *entry.relpath.split("/"))
+        if entry.is_dir:
+            directories.append((entry.path, target))
+        else:
+            files.append((entry.path, target, entry.stat.st_size))
+    return directories, files
+
+
+def transferTree(source: str, destination: str, move=False, workers=8, quiet=False):
+    """Copies or moves the contents of directory `source` into `destination`, merging with
+    and overwriting whatever is already there. Symlinks are transferred as links.
+
+    Moves within one device are renames: of the whole tree if `destination` doesn't exist yet,
+    otherwise file by file. Everything else is copied by `workers` threads at once, and,
+    for moves, removed from `source` once copied.
+
+    Args:
+        source (str): Source directory
+        destination (str): Destination directory
+        move (bool, optional): Remove `source` afterwards
+        workers (int, optional): Number of files copied at once
+        quiet (bool, optional): Don't display progress and throughput
+
+    Returns:
+        list: Destination paths of transferred files
+    """
+    import time
+    import tqdm
+    from .loom import Spool
+
+    start_time = time.time()
+    # An existing destination may be a mount point, on a different device from its parent.
+    if os.path.exists(destination):
+        dest_dev = os.stat(destination).st_dev
+    else:
+        parent = os.path.dirname(os.path.abspath(destination))
+        os.makedirs(parent, exist_ok=True)
+        dest_dev = os.stat(parent).st_dev
+    same_device = os.stat(source).st_dev == dest_dev
+
+    if move and same_device and not os.path.exists(destination):
+        os.rename(source, destination)
+        directories, files = _pairTree(destination, destination)
+        if not quiet:
+            logger.info("{} --> {} (renamed, {} files)".format(source, destination, len(files)))
+        return [dst for src, dst, size in files]
+
+    directories, files = _pairTree(source, destination)
+    for src_dir, dst_dir in directories:
+        os.makedirs(dst_dir, exist_ok=True)
+
+    total_bytes = sum(size for src, dst, size in files)
+    progbar = tqdm.tqdm(
+        desc=os.path.basename(source) or source, total=total_bytes,
+        unit="B", unit_scale=True, unit_divisor=1024, dynamic_ncols=True, disable=quiet
+    )
+
+    def transfer(src, dst, size, rename):
+        if rename:
+            os.replace(src, dst)
+        else:
+            if os.path.islink(dst):
+                os.unlink(dst)
+            copyFile(src, dst, follow_symlinks=False)
+            if move:
+                os.unlink(src)
+        progbar.update(size)
+
+    try:
+        with Spool(workers, "transferTree", use_progbar=False) as spool:
+            futures = []
+            for src, dst, size in files:
+                if move and same_device:
+                    # Renames are metadata-only; no point in threads.
+                    transfer(src, dst, size, rename=True)
+                else:
+                    futures.append(spool.enqueue(transfer, (src, dst, size, False)))
+        for future in futures:
+            future.result()
+    finally:
+        progbar.close()
+
+    if move:
+        for src_dir, dst_dir in reversed(directories):
+            os.rmdir(src_dir)
+
+    if not quiet:
+        elapsed = max(time.time() - start_time, 1e-9)
+        logger.info("{} --> {} ({} files, {}B at {}B/s)".format(
+            source, destination, len(files),
+            tqdm.tqdm.format_sizeof(total_bytes, divisor=1024),
+            tqdm.tqdm.format_sizeof(total_bytes / elapsed, divisor=1024)
+        ))
+    return [dst for src, dst, size in files]
 
 
 def moveFileToDir(source: str, destination: str, clobber=False, quiet=False):
@@ -391,6 +1603,23 @@ def moveFileToDir(source: str, destination: str, clobber=False, quiet=False):
     return opFileToDir(shutil.move, source, destination, clobber, quiet)
 
 
+def moveFilesToDir(sources, destination: str, clobber=False, quiet=False, workers=1):
+    """Moves files `sources` to folder `destination`, checking them all before moving any.
+
+    Args:
+        sources (iterable): Source paths
+        destination (str): Destination path
+        clobber (bool, optional): Error instead of overwriting existing files.
+        quiet (bool, optional): Print progress to screen
+        workers (int, optional): Number of files moved at once
+
+    Returns:
+        list: Destination paths
+    """
+    import shutil
+    return opFilesToDir(shutil.move, sources, destination, clobber, quiet, workers=workers, count_same_device=False)
+
+
 def moveFileToFile(source: str, destination: str, clobber=False, quiet=False):
     """Moves file `source` to file `destination`.
 
@@ -435,5 +1664,6 @@ def moveDirWithMerge(source: str, destination: str, clobber=False, quiet=False):
     Returns:
         list: Destination paths
     """
-    return opDirWithMerge(_copyTreeAndRemove, source, destination, clobber, quiet)
+    from functools import partial
+    return opDirWithMerge(partial(transferTree, move=True, quiet=quiet), source, destination, clobber, quiet)
 
@@ -1,21 +1,500 @@
 # Hashing
 
+BUFSIZE = 1024 * 1024
 
-def md5file(path):
+
+class _CRC32():
+
+    """Running CRC32, with the same update/hexdigest interface as the hashlib hashers.
+    """
+
+    name = "crc32"
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        from binascii import crc32
+        self.value = crc32(data, self.value)
+
+    def hexdigest(self):
+        return "{:08X}".format(self.value & 0xFFFFFFFF)
+
+
+def _makeHasher(algorithm):
+    """Create a hasher for an algorithm name.
+
+    Args:
+        algorithm (str): "crc32", an xxhash name like "xxh64" (needs the xxhash package),
+            or any name hashlib.new accepts
+
+    Returns:
+        A hasher with update and hexdigest methods
+    """
+    if algorithm.lower() == "crc32":
+        return _CRC32()
+    if algorithm.lower().startswith("xxh"):
+        import xxhash
+        return getattr(xxhash, algorithm.lower())()
+    import hashlib
+    return hashlib.new(algorithm)
+
+
+def fastAlgorithm():
+    """Name of the fastest available algorithm for telling file contents apart.
+    That's xxhash if it's installed, which is not cryptographic but hashes at memory speed,
+    or blake2b otherwise.
+
+    Returns:
+        str: Algorithm name, for hashfile and friends
+    """
+    try:
+        import xxhash
+    except ImportError:
+        return "blake2b"
+    return "xxh3_128" if hasattr(xxhash, "xxh3_128") else "xxh64"
+
+
+class HashCache():
+
+    """A persistent SQLite cache of file digests.
+    Entries are keyed by path and algorithm, and are only trusted while the file's
+    size, mtime, inode and device still match, so checking an unchanged file costs one stat.
+    The least recently used entries are evicted past `max_entries`.
+
+    Pass it as the `cache` argument to hashfile, md5file or CRC32file. Safe to share between threads.
+
+    Attributes:
+        path (str): Path to the database file
+        max_entries (int): Number of entries kept before evicting
+    """
+
+    # Files modified this recently might be modified again within the same mtime tick,
+    # which the cache couldn't tell apart. Don't cache them yet.
+    RACY_SECONDS = 2
+
+    def __init__(self, path, max_entries=1000000, commit_every=1000):
+        """Open or create a cache.
+
+        Args:
+            path (str): Path to the database file, or ":memory:" for a cache that isn't saved
+            max_entries (int, optional): Number of entries kept before evicting
+            commit_every (int, optional): Number of new entries written per transaction
+        """
+        import sqlite3
+        import threading
+
+        self.path = path
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        # Last use of entries that were looked up, by (path, algorithm). Written out on commit,
+        # so lookups alone never hold a write lock on the database.
+        self._touched = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS hashes (
+            path TEXT NOT NULL,
+            algorithm TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            device INTEGER NOT NULL,
+            digest TEXT NOT NULL,
+            used REAL NOT NULL,
+            PRIMARY KEY (path, algorithm)
+        )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS hashes_used ON hashes (used)")
+        self._db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+    @staticmethod
+    def _identity(st):
+        return (st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+
+    def lookup(self, path, st, algorithms):
+        """Get the cached digests of a file that are still valid.
+
+        Args:
+            path (str): Path to file
+            st (os.stat_result): Current stat of the file
+            algorithms (iterable): Algorithm names wanted
+
+        Returns:
+            dict: Hex digest by algorithm name, for the algorithms that were cached
+        """
+        import os
+        import time
+        path = os.path.abspath(path)
+        identity = self._identity(st)
+        found = {}
+        with self._lock:
+            for algorithm in algorithms:
+                row = self._db.execute(
+                    "SELECT size, mtime_ns, inode, device, digest FROM hashes WHERE path=? AND algorithm=?",
+                    (path, algorithm)
+                ).fetchone()
+                if row and tuple(row[:4]) == identity:
+                    found[algorithm] = row[4]
+            now = time.time()
+            for algorithm in found:
+                self._touched[(path, algorithm)] = now
+        return found
+
+    def store(self, path, st, digests):
+        """Record the digests of a file, as of stat `st`.
+
+        Args:
+            path (str): Path to file
+            st (os.stat_result): Stat of the file taken before hashing
+            digests (dict): Hex digest by algorithm name
+        """
+        import os
+        import time
+        now = time.time()
+        if now - st.st_mtime < self.RACY_SECONDS:
+            return
+        path = os.path.abspath(path)
+        with self._lock:
+            for algorithm in digests:
+                self._touched.pop((path, algorithm), None)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(path, algorithm, *self._identity(st), digest, now) for algorithm, digest in digests.items()]
+            )
+            self._commitSoon(len(digests))
+
+    def invalidate(self, path):
+        """Forget every digest of a file.
+
+        Args:
+            path (str): Path to file
+        """
+        import os
+        with self._lock:
+            self._db.execute("DELETE FROM hashes WHERE path=?", (os.path.abspath(path),))
+            self._commitSoon(1)
+
+    def _commitSoon(self, added):
+        """Commit once enough entries have been written, evicting old ones. Call with the lock held.
+        """
+        self._uncommitted += added
+        if self._uncommitted >= self.commit_every:
+            self._commit()
+
+    def _commit(self):
+        if self._touched:
+            self._db.executemany(
+                "UPDATE hashes SET used=? WHERE path=? AND algorithm=?",
+                [(used, path, algorithm) for (path, algorithm), used in self._touched.items()]
+            )
+            self._touched.clear()
+        self._db.execute(
+            "DELETE FROM hashes WHERE rowid IN (SELECT rowid FROM hashes ORDER BY used LIMIT max(0, (SELECT COUNT(*) FROM hashes) - ?))",
+            (self.max_entries,)
+        )
+        self._db.commit()
+        self._uncommitted = 0
+
+    def flush(self):
+        """Write pending entries to disk.
+        """
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        """Write pending entries and close the database.
+        """
+        with self._lock:
+            self._commit()
+            self._db.close()
+
+
+def _feedMapped(afile, hashers, bufsize):
+    """Feed the hashers straight from a memory map of an open file.
+
+    Returns:
+        bool: False if the file can't be mapped, and nothing was hashed
+    """
+    import mmap
+    import os
+    import stat
+    st = os.fstat(afile.fileno())
+    if not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+        return False
+    try:
+        mapping = mmap.mmap(afile.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return False
+    with mapping:
+        if hasattr(mapping, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            mapping.madvise(mmap.MADV_SEQUENTIAL)
+        with memoryview(mapping) as view:
+            for start in range(0, len(view), bufsize):
+                for hasher in hashers:
+                    hasher.update(view[start:start + bufsize])
+    return True
+
+
+def _feedBuffered(afile, hashers, bufsize):
+    """Feed the hashers from an open file, through one reused buffer.
+    """
+    buf = bytearray(bufsize)
+    view = memoryview(buf)
+    while True:
+        size = afile.readinto(buf)
+        if not size:
+            break
+        for hasher in hashers:
+            hasher.update(view[:size])
+
+
+def hashfile(path, algorithms=("crc32", "md5", "sha256"), bufsize=BUFSIZE, use_mmap=False, cache=None):
+    """Computes several hashes of the file at (str) path, reading it only once.
+    The file is streamed through a fixed buffer, so memory use doesn't grow with file size.
+
+    With `use_mmap`, regular files are hashed straight from a memory map instead,
+    skipping the copy into user space. This is fastest for files already in the page cache.
+    Pipes, devices, empty files and anything else that can't be mapped fall back to buffered reads.
+
+    Args:
+        path (str): Path to file
+        algorithms (tuple, optional): Names of the algorithms to compute, "crc32" or any hashlib name
+        bufsize (int, optional): Bytes read (or hashed from the map) at a time
+        use_mmap (bool, optional): Hash from a memory map where possible
+        cache (HashCache, optional): Reuse digests of unchanged files, and remember new ones
+
+    Returns:
+        dict: Hex digest by algorithm name. CRC32 is {:08X} formatted, like CRC32file.
+    """
+    digests = {}
+    if cache is not None:
+        import os
+        st = os.stat(path)
+        digests = cache.lookup(path, st, algorithms)
+
+    hashers = {algorithm: _makeHasher(algorithm) for algorithm in algorithms if algorithm not in digests}
+    if hashers:
+        with open(path, 'rb', buffering=0) as afile:
+            if not (use_mmap and _feedMapped(afile, hashers.values(), bufsize)):
+                _feedBuffered(afile, hashers.values(), bufsize)
+        new_digests = {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+        # Don't remember digests of a file that changed while we read it.
+        if cache is not None and HashCache._identity(os.stat(path)) == HashCache._identity(st):
+            cache.store(path, st, new_digests)
+        digests.update(new_digests)
+    return {algorithm: digests[algorithm] for algorithm in algorithms}
+
+
+def _isRotational(path):
+    """Guess whether the file at path lives on a spinning disk. Linux only.
+
+    Returns:
+        bool: True for rotational storage, False for solid-state or unknown
+    """
+    import os
+    try:
+        st_dev = os.stat(path).st_dev
+        block = os.path.realpath(f"/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}")
+        # Partitions keep their queue settings on the parent device.
+        for device in (block, os.path.dirname(block)):
+            flag = os.path.join(device, "queue", "rotational")
+            if os.path.isfile(flag):
+                with open(flag) as fp:
+                    return fp.read().strip() == "1"
+    except (OSError, AttributeError):
+        pass
+    return False
+
+
+def _walkFiles(root):
+    """Yield (path, stat) of every regular file under root, without following symlinks.
+    """
+    import stat
+    from .filesystem import scanTree
+    for entry in scanTree(root):
+        if stat.S_ISREG(entry.stat.st_mode):
+            yield (entry.path, entry.stat)
+
+
+def hashfiles(paths, algorithms="md5", workers=None, processes=False, sort=True, bufsize=BUFSIZE, use_mmap=False, cache=None):
+    """Hashes many files in parallel, yielding results as they finish.
+
+    Files are read in (device, inode) order, which roughly follows their layout on disk
+    and keeps spinning disks from seeking back and forth. On rotational storage the default
+    is a single reader; on solid-state storage it is one per CPU, to keep the device's queue full.
+
+    Args:
+        paths (str or iterable): A directory to hash recursively, or an iterable of file paths
+        algorithms (str or tuple, optional): An algorithm name, or several, as in hashfile
+        workers (int, optional): Number of threads or processes. Defaults to a guess from the storage type.
+        processes (bool, optional): Hash in worker processes rather than threads
+        sort (bool, optional): Read files in inode order
+        bufsize (int, optional): Bytes read at a time
+        use_mmap (bool, optional): Hash from a memory map where possible, see hashfile
+        cache (HashCache, optional): Digest cache, see hashfile. Only used from this thread.
+
+    Yields:
+        tuple: (path, digest), in completion order. The digest is a hex string if `algorithms`
+        is a single name, otherwise a dict like hashfile returns.
+    """
+    import os
+    from .loom import ThreadSpool, ProcessSpool
+
+    single = isinstance(algorithms, str)
+    if single:
+        algorithms = (algorithms,)
+
+    if isinstance(paths, (str, os.PathLike)):
+        root = paths
+        files = list(_walkFiles(root))
+    else:
+        root = None
+        files = [(path, os.stat(path)) for path in paths]
+    if sort:
+        files.sort(key=lambda file: (file[1].st_dev, file[1].st_ino))
+
+    if workers is None:
+        probe = root or (files[0][0] if files else ".")
+        workers = 1 if _isRotational(probe) else (os.cpu_count() or 1)
+
+    def result(path, digests):
+        return (path, digests[algorithms[0]] if single else digests)
+
+    spool_class = ProcessSpool if processes else ThreadSpool
+    spool = spool_class(workers, name="hashfiles", use_progbar=False, order="fifo")
+    pending = {}
+    try:
+        for path, st in files:
+            cached = cache.lookup(path, st, algorithms) if cache is not None else {}
+            missing = tuple(algorithm for algorithm in algorithms if algorithm not in cached)
+            if not missing:
+                yield result(path, cached)
+                continue
+            future = spool.enqueue(hashfile, (path, missing, bufsize, use_mmap))
+            pending[future] = (path, st, cached)
+
+        for future in spool.as_completed(futures=list(pending)):
+            path, st, digests = pending.pop(future)
+            new_digests = future.result()
+            if cache is not None and HashCache._identity(os.stat(path)) == HashCache._identity(st):
+                cache.store(path, st, new_digests)
+            digests.update(new_digests)
+            yield result(path, digests)
+    finally:
+        if pending:
+            spool.cancel()
+        else:
+            spool.finish()
+
+
+def fingerprint(path, blocksize=64 * 1024, algorithm=None):
+    """Returns a quick fingerprint of the file at (str) path, from its size and
+    the blocks at its start, middle and end. Files that differ usually differ there,
+    so this reads at most three blocks instead of the whole file.
+    Files no bigger than three blocks are hashed whole.
+
+    Args:
+        path (str): Path to file
+        blocksize (int, optional): Bytes read from each sampled position
+        algorithm (str, optional): Algorithm name, as in hashfile. Defaults to fastAlgorithm().
+
+    Returns:
+        str: Hex digest. Equal files have equal fingerprints; the converse isn't guaranteed
+        unless the file is small enough to be hashed whole.
+    """
+    import os
+    hasher = _makeHasher(algorithm or fastAlgorithm())
+    with open(path, 'rb', buffering=0) as afile:
+        size = os.fstat(afile.fileno()).st_size
+        hasher.update(size.to_bytes(8, "little"))
+        if size <= blocksize * 3:
+            _feedBuffered(afile, [hasher], blocksize)
+        else:
+            for offset in (0, (size - blocksize) // 2, size - blocksize):
+                afile.seek(offset)
+                hasher.update(afile.read(blocksize))
+    return hasher.hexdigest()
+
+
+def findDuplicates(paths, blocksize=64 * 1024, algorithm=None, workers=None, cache=None):
+    """Finds files with identical contents, reading as little as possible.
+    Files are compared by size first, then by fingerprint, and only files that still
+    collide are hashed in full.
+
+    Args:
+        paths (str or iterable): A directory to search recursively, or an iterable of file paths
+        blocksize (int, optional): Block size for fingerprints
+        algorithm (str, optional): Algorithm name for fingerprints and full hashes. Defaults to fastAlgorithm().
+        workers (int, optional): Number of threads for full hashes, see hashfiles
+        cache (HashCache, optional): Digest cache for full hashes
+
+    Returns:
+        list: Lists of paths with identical contents, each with at least two entries
+    """
+    import os
+    import collections
+
+    algorithm = algorithm or fastAlgorithm()
+
+    if isinstance(paths, (str, os.PathLike)):
+        files = list(_walkFiles(paths))
+    else:
+        files = [(path, os.stat(path)) for path in paths]
+    files.sort(key=lambda file: (file[1].st_dev, file[1].st_ino))
+
+    def collisions(groups):
+        return [group for group in groups.values() if len(group) > 1]
+
+    by_size = collections.defaultdict(list)
+    for path, st in files:
+        by_size[st.st_size].append(path)
+
+    duplicates = []
+    by_fingerprint = collections.defaultdict(list)
+    for group in collisions(by_size):
+        for path in group:
+            by_fingerprint[fingerprint(path, blocksize, algorithm)].append(path)
+    suspects = []
+    for group in collisions(by_fingerprint):
+        if os.path.getsize(group[0]) <= blocksize * 3:
+            # Fingerprinted whole; already certain.
+            duplicates.append(group)
+        else:
+            suspects.extend(group)
+
+    by_digest = collections.defaultdict(list)
+    for path, digest in hashfiles(suspects, algorithm, workers=workers, cache=cache):
+        by_digest[(os.path.getsize(path), digest)].append(path)
+    duplicates.extend(collisions(by_digest))
+    return duplicates
+
+
+def md5file(path, bufsize=BUFSIZE, use_mmap=False, cache=None):
     """Returns the md5 hash of the file at (str) path.
 
     Args:
         path (str): Path to file
+        bufsize (int, optional): Bytes read at a time
+        use_mmap (bool, optional): Hash from a memory map where possible, see hashfile
+        cache (HashCache, optional): Digest cache, see hashfile
 
     Returns:
         str: Hex digest of md5 hash
     """
-    from hashlib import md5
-    hasher = md5()
-    with open(path, 'rb') as afile:
-        buf = afile.read()
-        hasher.update(buf)
-    return hasher.hexdigest()
+    return hashfile(path, ("md5",), bufsize=bufsize, use_mmap=use_mmap, cache=cache)["md5"]
 
 def md5data(data):
     """Returns the md5 hash of some data
@@ -32,20 +511,20 @@ def md5data(data):
     return hasher.hexdigest()
 
 
-def CRC32file(filename):
+def CRC32file(filename, bufsize=BUFSIZE, use_mmap=False, cache=None):
     """Returns the CRC32 "hash" of the file at (str) path.
 
     Args:
         filename (str): Path to file
+        bufsize (int, optional): Bytes read at a time
+        use_mmap (bool, optional): Hash from a memory map where possible, see hashfile
+        cache (HashCache, optional): Digest cache, see hashfile
 
     Returns:
         str: Formated CRC32, as {:08X} formatted.
 
     """
-    from binascii import crc32
-    buf = open(filename, 'rb').read()
-    buf = (crc32(buf) & 0xFFFFFFFF)
-    return "{:08X}".format(buf)
+    return hashfile(filename, ("crc32",), bufsize=bufsize, use_mmap=use_mmap, cache=cache)["crc32"]
 
 
 def CRC32data(data):
@@ -63,27 +63,112 @@ def json_load(filename, basepath=basepath_json, default=None):
             raise
 
 
-def json_save(object, filepath, basepath=basepath_json):
+def link_backup(filepath, backup_path):
+    """Point backup_path at filepath's current contents, replacing any old backup.
+    Uses a hard link, so nothing is copied; falls back to copying where links aren't supported.
+    Only safe while filepath is replaced, never rewritten in place, as json_save does.
+
+    Args:
+        filepath (str): File to back up
+        backup_path (str): Backup path
+    """
+    import os
+    temp_path = backup_path + ".tmp"
+    if path.lexists(temp_path):
+        os.unlink(temp_path)
+    try:
+        os.link(filepath, temp_path)
+    except OSError:
+        shutil.copy2(filepath, temp_path)
+    os.replace(temp_path, backup_path)
+
+
+def _fsync_dir(dirpath):
+    import os
+    try:
+        fd = os.open(dirpath or ".", os.O_RDONLY)
+    except OSError:
+        # Windows can't open directories, and doesn't need this.
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _create_temp(dirpath, prefix):
+    """Create a new, uniquely named file for writing, like tempfile.mkstemp, but with the
+    permissions of any other new file rather than mkstemp's owner-only ones.
+
+    Returns:
+        tuple: (file descriptor, path)
+    """
+    import os
+    import tempfile
+    names = tempfile._RandomNameSequence()
+    flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0)
+    while True:
+        temp_path = path.join(dirpath, prefix + next(names) + ".tmp")
+        try:
+            # The kernel applies the umask
+            return os.open(temp_path, flags, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+
+def json_save(object, filepath, basepath=basepath_json, atomic=True, fsync_dir=False):
     """Args:
         object (object)
         filename (string): Identifier for object
+        atomic (bool, optional): Write to a temporary file and swap it into place, so a crash
+            leaves either the old file or the new one, never a truncated one. The previous
+            version is kept as a hard-linked ".bak".
+        fsync_dir (bool, optional): Also flush the directory, so the swap itself survives power loss
     """
+    import os
     filepath = get_json_path(basepath, filepath)
     (fdirs, fname) = path.split(filepath)
     makedirs(fdirs, exist_ok=True)
 
-    # Displace
-    if path.isfile(filepath):
-        shutil.move(filepath, filepath + ".bak")
+    try:
+        data = json.dumps(object, indent=4)
+    except RuntimeError:
+        import copy
+        import traceback
+        traceback.print_exc()
+        data = json.dumps(copy.deepcopy(object), indent=4)
 
-    with open(filepath, 'w') as file:
-        try:
-            json.dump(object, file, indent=4)
-        except RuntimeError:
-            import copy
-            import traceback
-            traceback.print_exc()
-            json.dump(copy.deepcopy(object), file, indent=4)
+    if not atomic:
+        # Displace
+        if path.isfile(filepath):
+            # The backup may be a hard link to this very file, which a rename wouldn't separate.
+            if path.lexists(filepath + ".bak"):
+                os.unlink(filepath + ".bak")
+            shutil.move(filepath, filepath + ".bak")
+
+        with open(filepath, 'w', encoding="utf-8") as file:
+            file.write(data)
+        return
+
+    fd, temp_path = _create_temp(fdirs or ".", fname + ".")
+    try:
+        with open(fd, 'w', encoding="utf-8") as file:
+            if hasattr(os, "fchmod") and path.isfile(filepath):
+                # Keep the permissions of the file being replaced
+                os.fchmod(file.fileno(), os.stat(filepath).st_mode & 0o7777)
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        if path.isfile(filepath):
+            link_backup(filepath, filepath + ".bak")
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+    if fsync_dir:
+        _fsync_dir(fdirs)
 
 
 load = json_load
@@ -174,10 +259,10 @@ class RotatingHandler(Handler):
             return
         # print("Backing up", self.name)
         if path.exists(get_json_path(self.basepath, self.name)):
-            shutil.copy2(
+            link_backup(
                 get_json_path(self.basepath, self.name),
                 get_json_path(self.basepath, self.name) + ".bak"
-            ) 
+            )
 
     # def flush(self):
     #     super().flush()
@@ -8,46 +8,453 @@ Attributes:
 """
 
 import threading
+import time
 import traceback
 import sys
 import asyncio
+import collections
 import warnings
+import queue
+import concurrent.futures
+import multiprocessing
+import functools
+import heapq
+import inspect
+import itertools
+import os
 
 import tqdm
 from tqdm.contrib import DummyTqdmFile
 
 
+class SpoolJob():
+
+    """A single job queued on a spool.
+
+    Attributes:
+        future (concurrent.futures.Future): Resolves to the return value of the job.
+            None for AIOSpool jobs.
+        exception (BaseException): The exception the job raised, if any
+        enqueued_at (float): time.monotonic() when the job was queued
+        started_at (float): time.monotonic() when the job started, or None
+        finished_at (float): time.monotonic() when the job finished, or None
+    """
+
+    def __init__(self, target, args=None, kwargs=None, future=None):
+        self.target = target
+        self.args = args or tuple()
+        self.kwargs = kwargs or dict()
+        self.future = future
+        self.exception = None
+
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+
+    def __call__(self):
+        """Run the job and resolve its future, which must already be set running.
+        """
+        try:
+            result = self.target(*self.args, **self.kwargs)
+        except BaseException as e:
+            print("Aborting spooled thread", file=sys.stderr)
+            traceback.print_exc()
+            self.exception = e
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+    @property
+    def wait_time(self):
+        """Seconds spent queued before starting, or None if not started.
+        """
+        if self.started_at is None:
+            return None
+        return self.started_at - self.enqueued_at
+
+    @property
+    def run_time(self):
+        """Seconds spent running, or None if not finished.
+        """
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+class SpoolStats():
+
+    """Running totals of a spool's job timings, for tuning its quota.
+    Use the spool's .stats() for a snapshot.
+
+    Attributes:
+        history_length (int): Number of seconds of per-second throughput to keep
+    """
+
+    def __init__(self, history=60):
+        self.history_length = history
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Zero all counters.
+        """
+        with self._lock:
+            self.since = time.monotonic()
+            self.enqueued = 0
+            self.started = 0
+            self.finished = 0
+            self.failed = 0
+            self.cancelled = 0
+            self.wait_time = 0.0
+            self.run_time = 0.0
+            self.max_wait_time = 0.0
+            self.max_run_time = 0.0
+            # [second, jobs finished in that second]
+            self.history = collections.deque(maxlen=self.history_length)
+
+    def recordEnqueue(self, job):
+        with self._lock:
+            self.enqueued += 1
+
+    def recordStart(self, job):
+        with self._lock:
+            self.started += 1
+            self.wait_time += job.wait_time
+            self.max_wait_time = max(self.max_wait_time, job.wait_time)
+
+    def recordFinish(self, job):
+        with self._lock:
+            self.finished += 1
+            if job.exception is not None:
+                self.failed += 1
+            self.run_time += job.run_time
+            self.max_run_time = max(self.max_run_time, job.run_time)
+
+            second = int(job.finished_at)
+            if self.history and self.history[-1][0] == second:
+                self.history[-1][1] += 1
+            else:
+                self.history.append([second, 1])
+
+    def recordCancel(self, job):
+        with self._lock:
+            self.cancelled += 1
+
+    def snapshot(self, workers=0, running=0, queued=0):
+        """Summarize the totals.
+
+        Args:
+            workers (int, optional): Number of workers, for utilization
+            running (int, optional): Number of jobs running now
+            queued (int, optional): Number of jobs queued now
+
+        Returns:
+            dict: Counts, mean and max wait and run times in seconds, worker utilization
+            (fraction of worker time spent running jobs), overall and recent throughput in
+            jobs per second, and `history`, a list of (seconds since reset, jobs finished in that second).
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = max(now - self.since, 1e-9)
+            window = min(elapsed, self.history_length)
+            recent = sum(
+                count for second, count in self.history
+                if second >= now - self.history_length
+            )
+            return {
+                "elapsed": elapsed,
+                "enqueued": self.enqueued,
+                "started": self.started,
+                "finished": self.finished,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "queued": queued,
+                "running": running,
+                "workers": workers,
+                "mean_wait_time": (self.wait_time / self.started) if self.started else 0.0,
+                "max_wait_time": self.max_wait_time,
+                "mean_run_time": (self.run_time / self.finished) if self.finished else 0.0,
+                "max_run_time": self.max_run_time,
+                "utilization": (self.run_time / (elapsed * workers)) if workers else 0.0,
+                "throughput": self.finished / elapsed,
+                "recent_throughput": recent / window,
+                "history": [(second - int(self.since), count) for second, count in self.history],
+            }
+
+
+def _callHook(hook, job):
+    if hook is None:
+        return
+    try:
+        hook(job)
+    except Exception:
+        print("Exception in spool hook", file=sys.stderr)
+        traceback.print_exc()
+
+
+class TokenBucket():
+
+    """Limits how often jobs may start, allowing short bursts.
+    Tokens refill at `rate` per second, up to `burst` tokens. Each job start takes one.
+
+    A single bucket can be shared by several spools, to hold them all to one rate limit.
+    """
+
+    def __init__(self, rate, burst=1):
+        """Create a bucket
+
+        Args:
+            rate (float): Tokens added per second, i.e. the sustained jobs-per-second rate
+            burst (int, optional): Maximum tokens stored, i.e. how many jobs may start at once
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return f"{type(self)} at {hex(id(self))}: {self.rate}/s, burst {self.burst}"
+
+    def reserve(self, tokens=1):
+        """Take tokens from the bucket, going into debt if there aren't enough.
+
+        Args:
+            tokens (int, optional): Number of tokens to take
+
+        Returns:
+            float: Seconds to wait before the tokens may be used
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available.
+        """
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+    async def aacquire(self, tokens=1):
+        """Wait until tokens are available, without blocking the event loop.
+        """
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class JobQueue():
+
+    """A heap-backed queue of jobs, ordered by priority and then by `order`.
+    Lower priority values run first. Jobs of equal priority run first-in-first-out
+    with order="fifo", or last-in-first-out with order="lifo".
+
+    Queued jobs can be removed or given a new priority by key. Removed entries are
+    discarded lazily as they reach the top of the heap.
+    Not thread-safe; spools guard it with their own lock.
+    """
+
+    _REMOVED = object()
+
+    def __init__(self, order="lifo"):
+        """Create a queue
+
+        Args:
+            order (str, optional): "fifo" or "lifo", for jobs of equal priority
+        """
+        if order not in ("fifo", "lifo"):
+            raise ValueError(f"Unknown queue order {order!r}, expected 'fifo' or 'lifo'")
+        self.order = order
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, item, priority=0, key=None):
+        """Add an item to the queue.
+
+        Args:
+            item: The job
+            priority (int, optional): Lower values run first
+            key (hashable, optional): Handle to remove or reprioritize the job by. Defaults to a new handle.
+
+        Returns:
+            The key
+        """
+        if key is None:
+            key = object()
+        seq = next(self._counter)
+        if self.order == "lifo":
+            seq = -seq
+        self._add(key, item, priority, seq)
+        return key
+
+    def pop(self):
+        """Remove and return the next item.
+
+        Raises:
+            IndexError: If the queue is empty
+        """
+        while self._heap:
+            priority, seq, key, item = heapq.heappop(self._heap)
+            if item is not self._REMOVED:
+                del self._entries[key]
+                return item
+        raise IndexError("pop from an empty JobQueue")
+
+    def remove(self, key):
+        """Remove a queued item.
+
+        Returns:
+            The removed item, or None if it was not queued
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        item = entry[-1]
+        entry[-1] = self._REMOVED
+        # Don't let dead entries pile up
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [entry for entry in self._heap if entry[-1] is not self._REMOVED]
+            heapq.heapify(self._heap)
+        return item
+
+    def reprioritize(self, key, priority):
+        """Give a queued item a new priority. It keeps its place among items of that priority.
+
+        Returns:
+            bool: True if the item was still queued
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        old_priority, seq, key, item = entry
+        self.remove(key)
+        self._add(key, item, priority, seq)
+        return True
+
+    def drain(self):
+        """Remove and return all queued items, in no particular order.
+        """
+        items = [entry[-1] for entry in self._entries.values()]
+        self._heap.clear()
+        self._entries.clear()
+        return items
+
+    def _add(self, key, item, priority, seq):
+        if key in self._entries:
+            raise KeyError(f"{key!r} is already queued")
+        entry = [priority, seq, key, item]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+
+
+def _makeRateLimiter(rate, burst):
+    if rate is None or isinstance(rate, TokenBucket):
+        return rate
+    return TokenBucket(rate, burst)
+
+
 class ThreadSpool():
 
-    """A spool is a queue of threads.
+    """A spool is a queue of jobs, run by a pool of worker threads.
     This is a simple way of making sure you aren't running too many threads at one time.
-    At intervals, determined by `delay`, the spooler (if on) will start threads from the queue.
-    The spooler can start multiple threads at once.
+    The spool keeps `quota` long-lived workers, which pull jobs from the queue as they
+    become free, so no thread is created or torn down per job.
+
+    .enqueue returns a future for each job. Use .as_completed to consume results
+    as they become ready, or set `collect_results` to have .finish return them.
+
+    If `max_queued` is set, .enqueue blocks while the queue is full, so a fast
+    producer can't outrun the workers.
+
+    If `rate` is set, the spool starts at most `rate` jobs per second across all
+    workers, allowing bursts of up to `burst` jobs.
+
+    Jobs run in `order` ("lifo" or "fifo"), but a job enqueued with a lower `priority`
+    runs ahead of the rest. Queued jobs can be reprioritized or dropped by their future.
+
+    .stats() reports queue wait and run times, failures, worker utilization and throughput.
+    The `on_enqueue`, `on_start` and `on_finish` hooks are called with each SpoolJob,
+    on the thread that enqueued or ran it.
+
+    If `autoscale` is set, the spool measures throughput every `autoscale_interval` seconds
+    while jobs are waiting, and hill-climbs the quota between `min_quota` and `max_quota`
+    towards the most completed jobs per second.
 
     You can .print to this object, and it will intelligently print the arguments
     based on whether or not it's using a progress bar.
     """
 
-    def __init__(self, quota=8, name="Spool", belay=False, use_progbar=True):
+    def __init__(self, quota=8, name="Spool", belay=False, use_progbar=True, collect_results=False, max_queued=None, rate=None, burst=1, order="lifo", on_enqueue=None, on_start=None, on_finish=None, autoscale=False, min_quota=1, max_quota=None, autoscale_interval=1.0):
         """Create a spool
 
         Args:
             quota (int): Size of quota, i.e. how many threads can run at once.
-            cfinish (dict, optional): Description
+            name (str, optional): Name of the spool, for progress bars and worker threads
+            belay (bool, optional): Don't start running jobs until .start() or .finish()
+            use_progbar (bool, optional): Display a progress bar while finishing
+            collect_results (bool, optional): Keep job futures so .finish can return their results
+            max_queued (int, optional): Maximum number of waiting jobs before .enqueue blocks
+            rate (float or TokenBucket, optional): Maximum jobs started per second, or a shared bucket
+            burst (int, optional): Number of jobs that may start at once under `rate`
+            order (str, optional): "lifo" or "fifo", for jobs of equal priority
+            on_enqueue (function, optional): Called with each SpoolJob as it is queued
+            on_start (function, optional): Called with each SpoolJob as it starts
+            on_finish (function, optional): Called with each SpoolJob after it finishes
+            autoscale (bool, optional): Adjust the quota to maximize throughput
+            min_quota (int, optional): Smallest quota autoscaling may choose
+            max_quota (int, optional): Largest quota autoscaling may choose. Defaults to 4 * quota.
+            autoscale_interval (float, optional): Seconds between autoscaling adjustments
         """
         super(Spool, self).__init__()
         self.quota = quota
         self.name = name
         self.use_progbar = use_progbar
 
-        self.queue = []
-        self.started_threads = []
+        self.queue = JobQueue(order)
+        self.max_queued = max_queued
+        self.rate_limiter = _makeRateLimiter(rate, burst)
+        self.workers = []
+
+        self.collect_results = collect_results
+        self._collected = []
+        self._pending = set()
+        self._completion_queues = []
+
+        self.metrics = SpoolStats()
+        self.on_enqueue = on_enqueue
+        self.on_start = on_start
+        self.on_finish = on_finish
+
+        self.autoscale = autoscale
+        self.min_quota = min_quota
+        self.max_quota = max_quota or quota * 4
+        self.autoscale_interval = autoscale_interval
+        self._autoscaler = None
 
         self.flushing = 0
+        self.progbar = None
         self._pbar_max = 0
-        self.spoolThread = None
+        self._num_running = 0
+        self._worker_serial = 0
         self.background_spool = False
-        self.may_have_room = threading.Event()
+        self._finishing = False
+
+        # Workers wait on _work_ready, finish() waits on _job_done,
+        # and producers wait on _room when the queue is full.
+        self._lock = threading.Lock()
+        self._work_ready = threading.Condition(self._lock)
+        self._job_done = threading.Condition(self._lock)
+        self._room = threading.Condition(self._lock)
 
         if not belay:
             self.start()
@@ -60,12 +467,15 @@ class ThreadSpool():
             self.finish(resume=False)
         except KeyboardInterrupt:
             print("Spool got KeyboardInterrupt")
-            self.background_spool = False
-            self.queue = []
+            with self._lock:
+                self.background_spool = False
+                self._finishing = False
+                self._work_ready.notify_all()
+            self._dropQueue()
             raise
 
     def __str__(self):
-        return f"{type(self)} at {hex(id(self))}: {self.numRunningThreads}/{self.quota} threads running with {len(self.queue)} queued."
+        return f"{type(self)} at {hex(id(self))}: {self.numRunningThreads}/{self.quota} threads running with {self.numQueued} queued."
 
     # Interfaces
 
@@ -78,18 +488,21 @@ class ThreadSpool():
             print(*args, **kwargs)
 
     def start(self):
-        """Begin spooling threads in the background, if not already doing so.
+        """Begin running jobs in the background, if not already doing so.
         """
-        self.background_spool = True
-        if not (self.spoolThread and self.spoolThread.is_alive()):
-            self.spoolThread = threading.Thread(target=self.spoolLoop, name="Spooler")
-            self.spoolThread.start()
-            self.may_have_room.set()
+        with self._lock:
+            self.background_spool = True
+            self._fillWorkers()
+            self._startAutoscaler()
+            self._work_ready.notify_all()
 
     def cancel(self):
         """Abort immeditately, potentially without finishing threads.
+        Queued jobs are dropped and their futures cancelled.
         """
-        self.queue.clear()
+        self._dropQueue()
+        with self._lock:
+            self._collected.clear()
         self.finish()
 
     def finish(self, resume=False, verbose=False, use_pbar=None):
@@ -99,13 +512,21 @@ class ThreadSpool():
             resume (bool, optional): Resume spooling after finished
             verbose (bool, optional): Report progress towards queue completion.
             use_pbar (bool, optional): Graphically display progress towards queue completions
+
+        Returns:
+            list: If `collect_results` is set, the results of all jobs enqueued since the
+            last finish, in enqueue order. Raises the exception of the first job that failed.
         """
         if use_pbar is None:
             use_pbar = self.use_progbar
 
-        # Stop existing spools
-        self.background_spool = False
-        self.may_have_room.set()  # If we were paused before
+        # Stop background spooling, but keep the workers alive until we drain.
+        with self._lock:
+            self.background_spool = False
+            self._finishing = True
+            self._fillWorkers()
+            self._startAutoscaler()
+            self._work_ready.notify_all()
 
         if verbose:
             print(self)
@@ -114,11 +535,9 @@ class ThreadSpool():
         def updateProgressBar():
             # Update progress bar.
             if use_pbar:
-                q = (len(self.queue) if self.queue else 0)
+                q = self.numQueued
                 progress = (self._pbar_max - (self.numRunningThreads + q))
-                # progress = (self._pbar_max - q)
                 if progress < 0:
-                    # print(f"{progress=} {self._pbar_max=} {self.numRunningThreads=} {q=}")
                     progress = 0
 
                 progbar.total = self._pbar_max
@@ -126,215 +545,666 @@ class ThreadSpool():
                 progbar.set_postfix(queue=q, running=f"{self.numRunningThreads:2}/{self.quota}]")
                 progbar.update(0)
 
-        self._pbar_max = self.numRunningThreads + (len(self.queue) if self.queue else 0)
-
-        if self._pbar_max > 0:
-
-            try:
-                if use_pbar:
-                    orig_out_err = sys.stdout, sys.stderr
-                    sys.stdout, sys.stderr = map(DummyTqdmFile, orig_out_err)
-                    self.progbar = progbar = tqdm.tqdm(
-                        file=orig_out_err[0], dynamic_ncols=True,
-                        desc=self.name,
-                        total=self._pbar_max,
-                        unit="job"
-                    )
+        self._pbar_max = self.numRunningThreads + self.numQueued
 
+        try:
+            if self._pbar_max > 0:
+                try:
+                    if use_pbar:
+                        orig_out_err = sys.stdout, sys.stderr
+                        sys.stdout, sys.stderr = map(DummyTqdmFile, orig_out_err)
+                        self.progbar = progbar = tqdm.tqdm(
+                            file=orig_out_err[0], dynamic_ncols=True,
+                            desc=self.name,
+                            total=self._pbar_max,
+                            unit="job"
+                        )
+
+                        updateProgressBar()
+
+                    # Block until the workers drain the queue.
+                    while True:
+                        with self._lock:
+                            if not self.numQueued and self._num_running == 0:
+                                break
+                            self._job_done.wait()
+                        updateProgressBar()
                     updateProgressBar()
-                # assert not self.spoolThread.isAlive, "Background loop did not terminate"
-                # Create a spoolloop, but block until it deploys all threads.
-                while (self.queue and len(self.queue) > 0) or (self.numRunningThreads > 0):
-                    self.may_have_room.wait()
-                    self.doSpool(verbose=False, callbacks=[updateProgressBar])
-                updateProgressBar()
 
-                if not len(self.queue) == 0:
-                    raise AssertionError("Finished without deploying all threads")
-                if not self.numRunningThreads == 0:
-                    raise AssertionError("Finished without finishing all threads")
-
-            finally:
-                if use_pbar:
-                    progbar.close()
-                    sys.stdout, sys.stderr = orig_out_err
-
-        if resume:
-            self.queue.clear()  # Create a fresh queue
-            self.start()
+                    if not self.numQueued == 0:
+                        raise AssertionError("Finished without deploying all threads")
+                    if not self.numRunningThreads == 0:
+                        raise AssertionError("Finished without finishing all threads")
+
+                finally:
+                    if use_pbar:
+                        progbar.close()
+                        self.progbar = None
+                        sys.stdout, sys.stderr = orig_out_err
+        finally:
+            with self._lock:
+                self._finishing = False
+                if resume:
+                    self.background_spool = True
+                    self._fillWorkers()
+                # Idle workers exit if we aren't resuming
+                self._work_ready.notify_all()
+                self._room.notify_all()
+                collected, self._collected = self._collected, []
 
         if verbose:
             print(self)
 
+        if self.collect_results:
+            return [future.result() for future in collected]
+
     def flush(self):
         """Start and finishes all current threads before starting any new ones.
         """
-        self.flushing = 1
+        with self._lock:
+            self.flushing = 1
 
-    def enqueue(self, target, args=None, kwargs=None, *thargs, **thkwargs):
-        """Add a thread to the back of the queue.
+    def enqueue(self, target, args=None, kwargs=None, *thargs, priority=0, **thkwargs):
+        """Add a job to the back of the queue.
 
         Args:
             target (function): The function to execute
-            name (str): Name of thread, for debugging purposes
             args (tuple, optional): Description
             kwargs (dict, optional): Description
+            priority (int, optional): Lower values run first
+
+            *thargs: Ignored; jobs run on the spool's worker threads.
+            **thkwargs: Ignored; jobs run on the spool's worker threads.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the return value of `target`
 
-            *thargs: Args for threading.Thread
-            **thkwargs: Kwargs for threading.Thread
+        Raises:
+            queue.Full: If the queue is full and the spool isn't running to drain it
         """
-        args = args or tuple()
-        kwargs = kwargs or dict()
+        job = SpoolJob(target, args, kwargs, concurrent.futures.Future())
+        self.metrics.recordEnqueue(job)
+        _callHook(self.on_enqueue, job)
+
+        with self._lock:
+            while self.max_queued and self.numQueued >= self.max_queued:
+                if threading.current_thread() in self.workers:
+                    # A job spawning more jobs mustn't wait on itself.
+                    break
+                if not (self.background_spool or self._finishing):
+                    raise queue.Full(f"{self.name} queue is full and the spool is not running")
+                self._room.wait()
 
-        def runAndFlag():
-            try:
-                target(*args, **kwargs)
-            except:  # noqa: E722
-                print("Aborting spooled thread", file=sys.stderr)
-                traceback.print_exc()
-            finally:
-                self.may_have_room.set()
-        self.queue.append(threading.Thread(target=runAndFlag, *thargs, **thkwargs))
-        self._pbar_max += 1
-        self.may_have_room.set()
+            self._pending.add(job.future)
+            if self.collect_results:
+                self._collected.append(job.future)
+            self._queueJob(job, priority)
+            self._pbar_max += 1
+            self._work_ready.notify()
+
+        job.future.add_done_callback(self._onJobDone)
+        return job.future
+
+    def reprioritize(self, future, priority):
+        """Give a queued job a new priority.
+
+        Args:
+            future (concurrent.futures.Future): The future returned by .enqueue
+            priority (int): Lower values run first
+
+        Returns:
+            bool: True if the job was still queued
+        """
+        with self._lock:
+            return self.queue.reprioritize(future, priority)
+
+    def drop(self, future):
+        """Remove a queued job and cancel its future. Running jobs are unaffected.
+
+        Args:
+            future (concurrent.futures.Future): The future returned by .enqueue
+
+        Returns:
+            bool: True if the job was still queued
+        """
+        # Cancelling removes the job from the queue, via _onJobDone.
+        return future.cancel()
+
+    def as_completed(self, timeout=None, futures=None):
+        """Yield futures of jobs as they complete.
+        Without `futures`, waits on the jobs outstanding when called, plus any enqueued
+        while iterating, e.g. by other jobs. Jobs that already finished are not yielded,
+        so pass `futures` to collect jobs enqueued earlier.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait for any one job
+            futures (iterable, optional): Futures to wait on, including finished ones
+
+        Returns:
+            iterator: Completed (or cancelled) job futures
+
+        Raises:
+            concurrent.futures.TimeoutError: While iterating, if no job completes within `timeout`
+        """
+        # Not a generator itself, so waiting starts now rather than on the first next().
+        completed = queue.Queue()
+        if futures is not None:
+            futures = set(futures)
+            for future in futures:
+                future.add_done_callback(completed.put)
+            return self._yieldCompleted(completed, timeout, len(futures))
+
+        with self._lock:
+            self._completion_queues.append(completed)
+        return self._yieldCompleted(completed, timeout)
+
+    def _yieldCompleted(self, completed, timeout, count=None):
+        """Yield futures from a completion queue, `count` of them or until no jobs are pending.
+        """
+        if count is not None:
+            for i in range(count):
+                try:
+                    yield completed.get(timeout=timeout)
+                except queue.Empty:
+                    raise concurrent.futures.TimeoutError() from None
+            return
+
+        try:
+            while True:
+                with self._lock:
+                    if not self._pending and completed.empty():
+                        return
+                try:
+                    future = completed.get(timeout=timeout)
+                except queue.Empty:
+                    raise concurrent.futures.TimeoutError() from None
+                yield future
+        finally:
+            with self._lock:
+                self._completion_queues.remove(completed)
+
+    def stats(self):
+        """Snapshot of the spool's job timings, utilization and throughput.
+        See SpoolStats.snapshot.
+
+        Returns:
+            dict: Statistics
+        """
+        return self.metrics.snapshot(
+            workers=self.quota, running=self.numRunningThreads, queued=self.numQueued
+        )
 
     def setQuota(self, new_quota):
-        self.quota = new_quota
-        self.may_have_room.set()
+        with self._lock:
+            self.quota = new_quota
+            if self.background_spool or self._finishing:
+                self._fillWorkers()
+            # Surplus workers retire themselves
+            self._work_ready.notify_all()
 
     ##################
     # Minor utility
     ##################
 
-    def startThread(self, new_thread):
-        self.started_threads.append(new_thread)
-        new_thread.start()
-        # self.may_have_room.set()
+    def _onJobDone(self, future):
+        with self._lock:
+            if future.cancelled():
+                job = self.queue.remove(future)
+                if job:
+                    self._room.notify()
+                self.metrics.recordCancel(job)
+            self._pending.discard(future)
+            for completed in self._completion_queues:
+                completed.put(future)
+
+    def _dropQueue(self):
+        """Remove all queued jobs and cancel their futures.
+        """
+        with self._lock:
+            dropped = self.queue.drain()
+            self._room.notify_all()
+        # Cancelling runs done callbacks, which take the lock.
+        for job in dropped:
+            job.future.cancel()
 
     @property
     def numRunningThreads(self):
-        """Accurately count number of "our" running threads.
+        """Count the number of jobs our workers are currently running.
 
         Returns:
-            int: Number of running threads owned by this spool
+            int: Number of running jobs owned by this spool
         """
-        return len([
-            thread
-            for thread in self.started_threads
-            if thread.is_alive()
-        ])
+        return self._num_running
+
+    @property
+    def numQueued(self):
+        """Count the number of jobs waiting to run.
+
+        Returns:
+            int: Number of queued jobs
+        """
+        return len(self.queue)
 
     ##################
     # Spooling
     ##################
 
-    def spoolLoop(self, verbose=False):
-        """Periodically start additional threads, if we have the resources to do so.
-        This function is intended to be run as a thread.
-        Runs until the queue is empty or, if self.background_spool is true, runs forever.
+    def _fillWorkers(self):
+        """Start workers until there are `quota` of them. Call with the lock held.
+        """
+        while len(self.workers) < self.quota:
+            self._worker_serial += 1
+            worker = threading.Thread(
+                target=self._workerLoop,
+                name=f"{self.name} worker {self._worker_serial}"
+            )
+            self.workers.append(worker)
+            worker.start()
+
+    def _startAutoscaler(self):
+        """Start the autoscaling thread, if enabled and not already running. Call with the lock held.
+        """
+        if self.autoscale and self._autoscaler is None:
+            self._autoscaler = threading.Thread(
+                target=self._autoscaleLoop,
+                name=f"{self.name} autoscaler",
+                daemon=True
+            )
+            self._autoscaler.start()
+
+    def _autoscaleLoop(self, tolerance=0.05):
+        """Hill-climb the quota towards the highest throughput.
+        Keeps changing the quota in the same direction while throughput improves, and turns back
+        when it drops, or when it stays flat while jobs take longer.
+        This function is intended to be run as a thread, while the spool is running.
 
         Args:
-            verbose (bool, optional): Report progress towards queue completion.
+            tolerance (float, optional): Relative change in throughput treated as noise
         """
-        
+        direction = 1
+        last_throughput = last_latency = None
+        last_finished, last_run_time = self.metrics.finished, self.metrics.run_time
+
         while True:
-            self.may_have_room.wait()
-            if not self.background_spool:
-                break
-            #   self.may_have_room.set()
-            self.doSpool(verbose=verbose)
+            time.sleep(self.autoscale_interval)
+            with self._lock:
+                if not (self.background_spool or self._finishing):
+                    self._autoscaler = None
+                    return
+                # Without a backlog, the quota isn't what limits throughput.
+                saturated = self.numQueued > 0
+                quota = self.quota
+
+            finished, run_time = self.metrics.finished, self.metrics.run_time
+            done = finished - last_finished
+            throughput = done / self.autoscale_interval
+            latency = ((run_time - last_run_time) / done) if done else None
+            last_finished, last_run_time = finished, run_time
+
+            if not saturated:
+                last_throughput = last_latency = None
+                continue
+
+            if last_throughput is not None:
+                if throughput < last_throughput * (1 - tolerance):
+                    direction = -direction
+                elif (
+                    throughput <= last_throughput * (1 + tolerance)
+                    and latency and last_latency
+                    and latency > last_latency * (1 + tolerance)
+                ):
+                    direction = -1
+
+            step = max(1, quota // 4)
+            new_quota = min(self.max_quota, max(self.min_quota, quota + direction * step))
+            if new_quota == quota:
+                # Bounce off the bounds
+                direction = -direction
+            last_throughput, last_latency = throughput, latency
+            if new_quota != quota:
+                self.setQuota(new_quota)
+
+    def _queueJob(self, job, priority=0):
+        """Add a job to the queue. Call with the lock held.
+        """
+        self.queue.push(job, priority, key=job.future)
+
+    def _popJob(self):
+        """Take the next job to run from the queue. Call with the lock held.
+        """
+        return self.queue.pop()
+
+    def _jobCost(self, job):
+        """Number of rate limit tokens a queued job takes to start.
+        """
+        return 1
 
-    def doSpool(self, verbose=False, callbacks=None):
-        """Spools new threads until the queue empties or the quota fills.
+    def _jobStarted(self, job):
+        job.started_at = time.monotonic()
+        self.metrics.recordStart(job)
+        _callHook(self.on_start, job)
+
+    def _jobFinished(self, job):
+        if job.finished_at is None:
+            job.finished_at = time.monotonic()
+        self.metrics.recordFinish(job)
+        _callHook(self.on_finish, job)
+
+    def _runJob(self, job):
+        """Run a job taken from the queue on this worker thread.
+        """
+        if not job.future.set_running_or_notify_cancel():
+            return
+        self._jobStarted(job)
+        try:
+            job()
+        finally:
+            self._jobFinished(job)
+
+    def _nextJob(self):
+        """Wait for a job this worker may run. Call with the lock held.
+
+        Returns:
+            Callable: The job, or None if the worker should exit.
+        """
+        while True:
+            if not (self.background_spool or self._finishing):
+                return None
+            if len(self.workers) > self.quota:
+                return None
+
+            if self.flushing == 1:
+                # Finish running threads
+                if self._num_running == 0:
+                    self.flushing = 0
+            if self.numQueued and not self.flushing:
+                self._room.notify()
+                return self._popJob()
+
+            self._work_ready.wait()
+
+    def _workerLoop(self):
+        """Run jobs from the queue until the spool stops or shrinks.
+        This function is intended to be run as a thread.
+        """
+        while True:
+            with self._lock:
+                job = self._nextJob()
+                if job is None:
+                    self.workers.remove(threading.current_thread())
+                    return
+                self._num_running += 1
+
+            try:
+                if self.rate_limiter:
+                    self.rate_limiter.acquire(self._jobCost(job))
+                self._runJob(job)
+            finally:
+                with self._lock:
+                    self._num_running -= 1
+                    if self.flushing and self._num_running == 0:
+                        self._work_ready.notify_all()
+                    self._job_done.notify_all()
+
+
+def _runChunkInProcess(chunk):
+    """Run a chunk of jobs in a worker process.
+
+    Args:
+        chunk (list): List of (target, args, kwargs) tuples
+
+    Returns:
+        list: (succeeded, result or exception, start, duration) for each job, in order.
+        Times are in seconds, starts relative to the start of the chunk.
+    """
+    results = []
+    chunk_start = time.perf_counter()
+    for target, args, kwargs in chunk:
+        start = time.perf_counter()
+        try:
+            succeeded, value = True, target(*args, **kwargs)
+        except Exception as e:
+            print("Aborting spooled process job", file=sys.stderr)
+            traceback.print_exc()
+            succeeded, value = False, e
+        results.append((succeeded, value, start - chunk_start, time.perf_counter() - start))
+    return results
+
+
+class ProcessSpool(ThreadSpool):
+
+    """A spool that runs its jobs in worker processes, for CPU-bound work.
+    Same interface as ThreadSpool; switch the class name to move work from threads to cores.
+
+    Jobs are sent to the processes in chunks of up to `chunksize`, to amortize pickling.
+    A worker takes whatever is queued, up to a full chunk, as soon as it is free.
+    Targets, arguments, results and exceptions must all be picklable,
+    so use module-level functions rather than lambdas or closures.
+    """
+
+    def __init__(self, quota=None, name="ProcessSpool", belay=False, use_progbar=True, collect_results=False, max_queued=None, rate=None, burst=1, order="lifo", on_enqueue=None, on_start=None, on_finish=None, chunksize=1):
+        """Create a spool
 
         Args:
-            verbose (bool, optional): Verbose output
+            quota (int, optional): Number of worker processes. Defaults to the number of CPUs.
+            name (str, optional): Name of the spool, for progress bars and worker threads
+            belay (bool, optional): Don't start running jobs until .start() or .finish()
+            use_progbar (bool, optional): Display a progress bar while finishing
+            collect_results (bool, optional): Keep job futures so .finish can return their results
+            max_queued (int, optional): Maximum number of waiting jobs before .enqueue blocks
+            rate (float or TokenBucket, optional): Maximum jobs started per second, or a shared bucket
+            burst (int, optional): Number of jobs that may start at once under `rate`
+            order (str, optional): "lifo" or "fifo", for jobs of equal priority
+            on_enqueue (function, optional): Called with each SpoolJob as it is queued
+            on_start (function, optional): Called with each SpoolJob as its chunk is sent
+            on_finish (function, optional): Called with each SpoolJob after its chunk returns
+            chunksize (int, optional): Maximum number of jobs sent to a process at once
         """
+        self.chunksize = chunksize
+        self.executor = None
+        self._num_running_jobs = 0
 
-        callbacks = callbacks or []
+        super().__init__(
+            quota=quota or os.cpu_count() or 1, name=name, belay=belay, use_progbar=use_progbar,
+            collect_results=collect_results, max_queued=max_queued, rate=rate, burst=burst, order=order,
+            on_enqueue=on_enqueue, on_start=on_start, on_finish=on_finish
+        )
 
-        if self.flushing == 1:
-            # Finish running threads
-            if self.numRunningThreads == 0:
-                self.flushing = 0
-            else:
-                # self.may_have_room.clear()
-                return
+    def finish(self, resume=False, verbose=False, use_pbar=None):
+        """Block and complete all jobs in queue. Shuts down the worker processes unless resuming.
 
-        # Start threads until we've hit quota, or until we're out of threads.
-        # threads_to_queue =
-        # drawbuffer = 80
-        # drawbuffer_c = 0
-        while len(self.queue) > 0 and self.quota - self.numRunningThreads > 0:
-            
-            if verbose:
-                print(self)
-            threads_to_queue = min(len(self.queue), self.quota - self.numRunningThreads)
-            for i in range(threads_to_queue):
-                try:
-                    self.startThread(self.queue.pop())
-                except IndexError:
-                    print(f"IndexError: Popped from empty queue?\nWhile queueing thread {len(self.queue)}-{self.quota}-{self.numRunningThreads}")
-                    break
-            # don't draw too often
-            # drawbuffer_c += 1
-            # drawbuffer_c %= drawbuffer
-            # if drawbuffer_c == 0:
-            for callback in callbacks:
-                callback()
+        Args:
+            resume (bool, optional): Resume spooling after finished
+            verbose (bool, optional): Report progress towards queue completion.
+            use_pbar (bool, optional): Graphically display progress towards queue completions
+
+        Returns:
+            list: If `collect_results` is set, the results of all jobs enqueued since the last finish.
+        """
+        try:
+            return super().finish(resume=resume, verbose=verbose, use_pbar=use_pbar)
+        finally:
+            if not resume:
+                self._shutdownExecutor()
+
+    def setQuota(self, new_quota):
+        super().setQuota(new_quota)
+        # Process pools can't be resized; the next chunk starts a new one.
+        self._shutdownExecutor()
+
+    ##################
+    # Minor utility
+    ##################
+
+    @property
+    def numRunningThreads(self):
+        """Count the number of jobs currently running in our processes.
+
+        Returns:
+            int: Number of running jobs owned by this spool
+        """
+        return self._num_running_jobs
+
+    def _getExecutor(self):
+        with self._lock:
+            if self.executor is None:
+                # Forking copies our threads' held locks (tqdm's, the logging module's) into the child,
+                # where nothing will ever release them. Start clean processes where we can.
+                mp_context = None
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    mp_context = multiprocessing.get_context("forkserver")
+                self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.quota, mp_context=mp_context)
+            return self.executor
+
+    def _shutdownExecutor(self):
+        with self._lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            # Chunks already submitted still complete.
+            executor.shutdown(wait=False)
+
+    ##################
+    # Spooling
+    ##################
 
-        self.may_have_room.clear()
+    def _jobCost(self, job):
+        # Popped jobs are partials over a chunk
+        return len(job.args[0])
 
-        # for callback in callbacks:
-        #     callback()
-        #     # threads_to_queue = min(len(self.queue), self.quota - self.numRunningThreads)
+    def _runJob(self, job):
+        # Popped jobs are partials over a chunk
+        job()
+
+    def _popJob(self):
+        chunk = [
+            self.queue.pop()
+            for i in range(min(self.chunksize, len(self.queue)))
+        ]
+        self._room.notify(len(chunk))
+        return functools.partial(self._runChunk, chunk)
+
+    def _runChunk(self, chunk):
+        """Send a chunk of jobs to a worker process and resolve their futures.
+        """
+        chunk = [job for job in chunk if job.future.set_running_or_notify_cancel()]
+        if not chunk:
+            return
+
+        with self._lock:
+            self._num_running_jobs += len(chunk)
+        for job in chunk:
+            self._jobStarted(job)
+        try:
+            results = self._getExecutor().submit(
+                _runChunkInProcess, [(job.target, job.args, job.kwargs) for job in chunk]
+            ).result()
+            # The jobs ran one after another in the other process. Place their timings
+            # back on our clock, counting back from when the chunk returned.
+            returned_at = time.monotonic()
+            last_start, last_duration = results[-1][2:]
+            chunk_started_at = returned_at - (last_start + last_duration)
+            for job, (succeeded, value, start, duration) in zip(chunk, results):
+                job.started_at = max(job.started_at, chunk_started_at + start)
+                job.finished_at = job.started_at + duration
+                if succeeded:
+                    job.future.set_result(value)
+                else:
+                    job.exception = value
+                    job.future.set_exception(value)
+                self._jobFinished(job)
+        except BaseException as e:
+            # The chunk never ran, e.g. it couldn't be pickled or the pool broke.
+            print("Aborting spooled process chunk", file=sys.stderr)
+            traceback.print_exc()
+            for job in chunk:
+                if not job.future.done():
+                    job.exception = e
+                    job.future.set_exception(e)
+                    self._jobFinished(job)
+        finally:
+            with self._lock:
+                self._num_running_jobs -= len(chunk)
 
 
 class AIOSpool():
 
-    """A spool is a queue of threads.
-    This is a simple way of making sure you aren't running too many threads at one time.
-    At intervals, determined by `delay`, the spooler (if on) will start threads from the queue.
-    The spooler can start multiple threads at once.
+    """A spool is a queue of async jobs, run by a pool of worker tasks.
+    This is a simple way of making sure you aren't running too many jobs at one time.
+    The spool keeps `quota` worker tasks, so exactly `quota` jobs are in flight while there is work.
+
+    A job may be a coroutine, or a coroutine function (or any callable returning an awaitable)
+    that is called only when a worker is free to run it. Use .feed to pass an iterable or
+    async iterable of jobs; it is consumed lazily, so a million jobs never exist in memory at once.
+
+    If `max_queued` is set, await .aenqueue to wait for room in the queue.
+
+    If `rate` is set, the spool starts at most `rate` jobs per second across all
+    workers, allowing bursts of up to `burst` jobs.
+
+    Queued jobs run in `order` ("lifo" or "fifo"), but a job enqueued with a lower `priority`
+    runs ahead of the rest. Queued jobs run before any fed jobs.
+
+    .stats() reports queue wait and run times, failures, worker utilization and throughput.
+    The `on_enqueue`, `on_start` and `on_finish` hooks are called with each SpoolJob.
 
     You can .print to this object, and it will intelligently print the arguments
     based on whether or not it's using a progress bar.
     """
 
-    def __init__(self, quota=8, jobs=None, name="AIOSpool", use_progbar=True):
+    def __init__(self, quota=8, jobs=None, name="AIOSpool", use_progbar=True, max_queued=None, rate=None, burst=1, order="lifo", on_enqueue=None, on_start=None, on_finish=None):
         """Create a spool
 
         Args:
-            quota (int): Size of quota, i.e. how many threads can run at once.
-            cfinish (dict, optional): Description
+            quota (int): Size of quota, i.e. how many jobs can run at once.
+            jobs (iterable, optional): Iterable or async iterable of jobs, consumed lazily
+            name (str, optional): Name of the spool, for progress bars
+            use_progbar (bool, optional): Display a progress bar while finishing
+            max_queued (int, optional): Maximum number of waiting jobs
+            rate (float or TokenBucket, optional): Maximum jobs started per second, or a shared bucket
+            burst (int, optional): Number of jobs that may start at once under `rate`
+            order (str, optional): "lifo" or "fifo", for queued jobs of equal priority
+            on_enqueue (function, optional): Called with each SpoolJob as it is queued or fed
+            on_start (function, optional): Called with each SpoolJob as it starts
+            on_finish (function, optional): Called with each SpoolJob after it finishes
         """
         jobs = jobs or []
 
         self.name = name
         self.use_progbar = use_progbar
         self.quota = quota
+        self.max_queued = max_queued
+        self.rate_limiter = _makeRateLimiter(rate, burst)
+
+        self.queue = JobQueue(order)
+        self.sources = []
+        self.workers = []
 
-        self.started_threads = []
-        self.queue = []
+        self.metrics = SpoolStats()
+        self.on_enqueue = on_enqueue
+        self.on_start = on_start
+        self.on_finish = on_finish
 
+        self.progbar = None
         self._pbar_max = 0
+        self._num_active = 0
+        self._closing = False
 
-        self.nop = (lambda: None)
-        self.on_finish_callbacks = [
-            self.doSpool
-        ]
+        self._has_room = asyncio.Event()
+        self._has_work = asyncio.Event()
+        self._job_done = asyncio.Event()
+        self._source_lock = asyncio.Lock()
 
         if isinstance(jobs, int):
             warnings.warn("Jobs should be iterable, not an int! You're using queue syntax!")
             jobs = []
 
-        if iter(jobs) and not isinstance(jobs, str):
-            for job in jobs:
-                self.enqueue(job)
-        else:
+        if isinstance(jobs, str):
             warnings.warn("Jobs should be iterable! You're using the wrong init syntax!")
-            
+        elif jobs:
+            self.feed(jobs)
+
     async def __aenter__(self):
+        self._fillWorkers()
         return self
 
     async def __aexit__(self, type_, value, traceback):
@@ -342,8 +1212,10 @@ class AIOSpool():
             return await self.finish(resume=False)
         except KeyboardInterrupt:
             print("Spool got KeyboardInterrupt")
-            self.background_spool = False
-            self.queue = []
+            self._closeJobs(self.queue.drain())
+            self.sources = []
+            for worker in self.workers:
+                worker.cancel()
             raise
 
     def __str__(self):
@@ -360,21 +1232,22 @@ class AIOSpool():
             print(*args, **kwargs)
 
     async def finish(self, resume=False, verbose=False, use_pbar=None):
-        """Block and complete all threads in queue.
+        """Block and complete all jobs in queue, including any remaining fed jobs.
         
         Args:
-            resume (bool, optional): Resume spooling after finished
+            resume (bool, optional): Keep the workers alive after finishing
             verbose (bool, optional): Report progress towards queue completion.
             use_pbar (bool, optional): Graphically display progress towards queue completions
         """
         if use_pbar is None:
             use_pbar = self.use_progbar
 
+        self._fillWorkers()
+
         if verbose:
             print(self)
 
         # Progress bar management, optional.
-        # Wrap the existing callback
         def updateProgressBar():
             # Update progress bar.
             if use_pbar:
@@ -385,12 +1258,10 @@ class AIOSpool():
                 progbar.n = progress
                 progbar.set_postfix(queue=q, waiting=f"{self.numActiveJobs:2}]")
                 progbar.update(0)
-        
-        self.on_finish_callbacks.insert(0, updateProgressBar)
 
         self._pbar_max = self.numActiveJobs + len(self.queue)
 
-        if self._pbar_max > 0:
+        if self._pbar_max > 0 or self.sources:
             try:
                 if use_pbar:
                     orig_out_err = sys.stdout, sys.stderr
@@ -404,8 +1275,10 @@ class AIOSpool():
 
                     updateProgressBar()
 
-                while self.numActiveJobs:
-                    await asyncio.gather(*self.started_threads)
+                while self.queue or self.sources or self.numActiveJobs:
+                    self._job_done.clear()
+                    await self._job_done.wait()
+                    updateProgressBar()
                 updateProgressBar()
 
                 if not self.numActiveJobs == 0:
@@ -413,71 +1286,226 @@ class AIOSpool():
             finally:
                 if use_pbar:
                     progbar.close()
+                    self.progbar = None
                     sys.stdout, sys.stderr = orig_out_err
 
+        if not resume:
+            # Retire the workers; enqueueing again starts new ones.
+            self._closing = True
+            self._has_work.set()
+            workers, self.workers = self.workers, []
+            await asyncio.gather(*workers)
+            self._closing = False
+
         if verbose:
             print(self)
 
-        self.on_finish_callbacks.remove(updateProgressBar)
+    def enqueue(self, target, args=None, kwargs=None, priority=0):
+        """Add a job to the back of the queue.
 
-    def on_finish_callback(self):
-        for c in self.on_finish_callbacks:
-            c()
+        Args:
+            target (coroutine or function): The coroutine to run, or a function returning one
+            args (tuple, optional): Arguments for `target`, if it is a function
+            kwargs (dict, optional): Keyword arguments for `target`, if it is a function
+            priority (int, optional): Lower values run first
 
-    def doSpool(self):
-        # While there is a queue
-        # This gets called from an ending job, so we don't count that one.
-        while len(self.queue) > 0 and (self.numActiveJobs - 1) < self.quota:
-            try:
-                # print(f"Starting job {len(self.queue)=} {self.numActiveJobs=} {self.quota=}")
-                future = self.queue.pop()
-                self.started_threads.append(asyncio.ensure_future(future))
-                
-            except IndexError:
-                print(f"IndexError: Popped from empty queue?\nWhile queueing thread {len(self.queue)}-{self.quota}-{self.numRunningThreads}")
-                break
-            # threads_to_queue = min(len(self.queue), self.quota - self.numRunningThreads)
-
-    def enqueue(self, target):
-        """Add a thread to the back of the queue.
+        Returns:
+            A handle for .reprioritize and .drop
+
+        Raises:
+            asyncio.QueueFull: If `max_queued` jobs are already waiting. Use .aenqueue to wait instead.
+        """
+        if self.max_queued and len(self.queue) >= self.max_queued:
+            raise asyncio.QueueFull(f"{self.name} queue is full")
+        return self._push(self._makeJob(target, args, kwargs), priority)
+
+    async def aenqueue(self, target, args=None, kwargs=None, priority=0):
+        """Add a job to the back of the queue, waiting for room if the queue is full.
 
         Args:
-            target (function): The function to execute
-            name (str): Name of thread, for debugging purposes
-            args (tuple, optional): Description
-            kwargs (dict, optional): Description
+            target (coroutine or function): The coroutine to run, or a function returning one
+            args (tuple, optional): Arguments for `target`, if it is a function
+            kwargs (dict, optional): Keyword arguments for `target`, if it is a function
+            priority (int, optional): Lower values run first
 
-            *thargs: Args for threading.Thread
-            **thkwargs: Kwargs for threading.Thread
+        Returns:
+            A handle for .reprioritize and .drop
         """
-        async def runAndFlag():
-            try:
-                await target
-            except:
-                print("Aborting spooled job", file=sys.stderr)
-                traceback.print_exc()
-            finally:
-                self.on_finish_callback()
-        self.queue.append(runAndFlag())
-        self._pbar_max += 1
-        self.on_finish_callback()
+        while self.max_queued and len(self.queue) >= self.max_queued:
+            self._has_room.clear()
+            await self._has_room.wait()
+        return self._push(self._makeJob(target, args, kwargs), priority)
+
+    def reprioritize(self, handle, priority):
+        """Give a queued job a new priority.
+
+        Args:
+            handle: The handle returned by .enqueue
+            priority (int): Lower values run first
+
+        Returns:
+            bool: True if the job was still queued
+        """
+        return self.queue.reprioritize(handle, priority)
+
+    def drop(self, handle):
+        """Remove a queued job. Running jobs are unaffected.
+
+        Args:
+            handle: The handle returned by .enqueue
+
+        Returns:
+            bool: True if the job was still queued
+        """
+        job = self.queue.remove(handle)
+        if job is None:
+            return False
+        self._closeJobs([job])
+        self._has_room.set()
+        self._job_done.set()
+        return True
+
+    def feed(self, jobs):
+        """Lazily take jobs from an iterable or async iterable.
+        Workers pull the next job only when they are free to run it.
+
+        Args:
+            jobs (iterable): Iterable or async iterable of jobs, as accepted by .enqueue
+        """
+        if hasattr(jobs, "__aiter__"):
+            self.sources.append(jobs.__aiter__())
+        else:
+            self.sources.append(iter(jobs))
+        self._has_work.set()
+        self._fillWorkers()
 
     ##################
     # Minor utility
     ##################
 
+    def stats(self):
+        """Snapshot of the spool's job timings, utilization and throughput.
+        See SpoolStats.snapshot.
+
+        Returns:
+            dict: Statistics
+        """
+        return self.metrics.snapshot(
+            workers=self.quota, running=self.numActiveJobs, queued=len(self.queue)
+        )
+
     @property
     def numActiveJobs(self):
-        """Accurately count number of "our" running threads.
+        """Count the number of "our" jobs that have started and not yet finished.
+
+        Returns:
+            int: Number of running jobs owned by this spool
+        """
+        return self._num_active
+
+    def _makeJob(self, target, args=None, kwargs=None):
+        job = target if isinstance(target, SpoolJob) else SpoolJob(target, args, kwargs)
+        self.metrics.recordEnqueue(job)
+        _callHook(self.on_enqueue, job)
+        return job
+
+    def _push(self, job, priority=0):
+        handle = self.queue.push(job, priority)
+        self._pbar_max += 1
+        self._has_work.set()
+        self._fillWorkers()
+        return handle
+
+    def _closeJobs(self, jobs):
+        for job in jobs:
+            self.metrics.recordCancel(job)
+            # Close dropped coroutines, so they don't warn that they were never awaited.
+            if inspect.iscoroutine(job.target):
+                job.target.close()
+
+    ##################
+    # Spooling
+    ##################
+
+    def _fillWorkers(self):
+        """Start worker tasks until there are `quota` of them.
+        Does nothing outside of a running event loop; workers start on .finish instead.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        while len(self.workers) < self.quota:
+            self.workers.append(asyncio.ensure_future(self._workerLoop()))
+
+    async def _nextJob(self):
+        """Wait for the next job to run.
 
         Returns:
-            int: Number of running threads owned by this spool
+            The job, or None if the worker should exit.
         """
-        return len([
-            thread
-            for thread in self.started_threads
-            if not thread.done()
-        ])
+        while True:
+            if self.queue:
+                self._has_room.set()
+                return self.queue.pop()
+
+            if self.sources:
+                async with self._source_lock:
+                    if not self.sources or self.queue:
+                        continue
+                    source = self.sources[0]
+                    try:
+                        if hasattr(source, "__anext__"):
+                            job = await source.__anext__()
+                        else:
+                            job = next(source)
+                    except (StopIteration, StopAsyncIteration):
+                        self.sources.remove(source)
+                        self._job_done.set()
+                        continue
+                    except Exception:
+                        print("Aborting spooled job source", file=sys.stderr)
+                        traceback.print_exc()
+                        self.sources.remove(source)
+                        self._job_done.set()
+                        continue
+                self._pbar_max += 1
+                return self._makeJob(job)
+
+            if self._closing:
+                return None
+            self._has_work.clear()
+            await self._has_work.wait()
+
+    async def _workerLoop(self):
+        while True:
+            job = await self._nextJob()
+            if job is None:
+                return
+            self._num_active += 1
+            try:
+                if self.rate_limiter:
+                    await self.rate_limiter.aacquire()
+                job.started_at = time.monotonic()
+                self.metrics.recordStart(job)
+                _callHook(self.on_start, job)
+                try:
+                    result = job.target
+                    if callable(result):
+                        result = result(*job.args, **job.kwargs)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as e:
+                    print("Aborting spooled job", file=sys.stderr)
+                    traceback.print_exc()
+                    job.exception = e
+                finally:
+                    job.finished_at = time.monotonic()
+                    self.metrics.recordFinish(job)
+                    _callHook(self.on_finish, job)
+            finally:
+                self._num_active -= 1
+                self._job_done.set()
 
 
 Spool = ThreadSpool
@@ -82,6 +82,8 @@ class ContentCanvas(tk.Canvas):
 
         self.preloaderLock = Lock()
         self.spool = loom.Spool(8, "ContentCanvas")
+        self.preloads: typing.Dict[str, typing.Any] = {}
+        self.watcher: typing.Optional[snip.filesystem.Watcher] = None
 
         self.current_file = ""
 
@@ -92,6 +94,8 @@ class ContentCanvas(tk.Canvas):
 
     def destroy(self):
         # self.spool.finish()
+        if self.watcher:
+            self.watcher.stop()
         self.spool.cancel()
         super().destroy()
 
@@ -172,12 +176,34 @@ class ContentCanvas(tk.Canvas):
 
     def markCacheDirty(self, entry: str):
         # logger.debug(f"Removing dirtied cache item {entry}")
-        self.photoImageCache.pop(entry, None)
+        for cache in list(self.photoImageCaches.values()):
+            cache.pop(entry, None)
         self.textCache.pop(entry, None)
 
+    def watchDirectory(self, directory) -> None:
+        """Drop cached content for files under `directory` as they change on disk.
+        Paths are matched as `directory` joined with their relative path, so pass the
+        directory the same way the files are passed to setFile.
+        """
+        if self.watcher:
+            self.watcher.stop()
+        self.watcher = snip.filesystem.Watcher(directory, self._onFilesChanged)
+        self.watcher.start()
+
+    def _onFilesChanged(self, events) -> None:
+        # Runs on the watcher's thread; cache dict operations are atomic.
+        for event in events:
+            if event.kind == "overflow":
+                self.markAllDirty()
+                continue
+            self.markCacheDirty(event.path)
+            if event.dest_path:
+                self.markCacheDirty(event.dest_path)
+
     def markAllDirty(self):
         # logger.debug("Clearing photoimage cache (all dirty)")
-        self.photoImageCache.clear()
+        for cache in list(self.photoImageCaches.values()):
+            cache.clear()
         self.textCache.clear()
 
     def clear(self):
@@ -230,19 +256,34 @@ class ContentCanvas(tk.Canvas):
         return True
 
     def preloadImage(self, filepaths) -> None:
+        """Decode images in the background, earliest filepaths first.
+        Preloads from a previous call that are still queued are reordered, or dropped if no longer wanted.
+        """
         if len(filepaths) > 20:
             return
-        for filepath in filepaths:
+
+        preloads, self.preloads = self.preloads, {}
+        for filepath, future in preloads.items():
+            if filepath not in filepaths:
+                self.spool.drop(future)
+
+        for priority, filepath in enumerate(filepaths):
             if filepath not in self.photoImageCache.keys():
                 # print("Path", filepath, "missing from cache", self.photoImageCache.keys())
-                def _do():
-                    self.spool.enqueue(
+                future = preloads.get(filepath)
+                if future and self.spool.reprioritize(future, priority):
+                    self.preloads[filepath] = future
+                    continue
+
+                def _do(filepath=filepath, priority=priority):
+                    self.preloads[filepath] = self.spool.enqueue(
                         target=self.makePhotoImage,
                         args=(
                             filepath,
                             self.winfo_width(),
                             self.winfo_height(),
-                        )
+                        ),
+                        priority=priority
                     )
                 self.after_idle(_do)
 
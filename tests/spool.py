@@ -2,13 +2,14 @@ import pytest
 import time
 import asyncio
 import sys
+import threading
 
-from snip.loom import Spool, AIOSpool
+from snip.loom import Spool, AIOSpool, ProcessSpool
 
 print('good day and welcome to tests')
 
-def dowork(work, i, say=None):
-    time.sleep(1)
+def dowork(work, i, say=None, delay=1):
+    time.sleep(delay)
     work.append(i)
     if say:
         print(say)
@@ -34,6 +35,124 @@ class TestData(object):
 
         assert len(work) == max
 
+    def test_pool(self):
+        names = set()
+        with Spool(4, "pool") as spool:
+            for i in range(0, 500):
+                spool.enqueue(lambda: names.add(threading.current_thread().name))
+
+        assert len(names) <= 4
+
+    def test_futures(self):
+        with Spool(4, "futures", collect_results=True) as spool:
+            futures = [spool.enqueue(pow, (i, 2)) for i in range(0, 100)]
+            failed = spool.enqueue(int, ("nan",))
+            completed = list(spool.as_completed(futures=futures + [failed]))
+            assert len(completed) == 101
+            assert set(completed) == set(futures + [failed])
+            with pytest.raises(ValueError):
+                spool.finish(resume=True)
+
+            assert [f.result() for f in futures] == [i ** 2 for i in range(0, 100)]
+            assert isinstance(failed.exception(), ValueError)
+
+            spool.enqueue(pow, (3, 2))
+            assert spool.finish(resume=True) == [9]
+
+            # Jobs finishing before iteration starts still count
+            for i in range(0, 4):
+                spool.enqueue(dowork, ([], i), {"delay": 0.05})
+            pending = spool.as_completed()
+            time.sleep(0.5)
+            assert len(list(pending)) == 4
+
+    def test_backpressure(self):
+        work = []
+        with Spool(2, "bounded", max_queued=4) as spool:
+            for i in range(0, 40):
+                spool.enqueue(dowork, (work, i), {"delay": 0.01})
+                assert len(spool.queue) <= 4
+
+        assert len(work) == 40
+
+    def test_process(self):
+        with ProcessSpool(2, "process", collect_results=True, chunksize=16) as spool:
+            for i in range(0, 100):
+                spool.enqueue(pow, (i, 2))
+            failed = spool.enqueue(int, ("nan",))
+            spool.enqueue(pow, (2, 2))
+
+            with pytest.raises(ValueError):
+                spool.finish(resume=True)
+            assert isinstance(failed.exception(), ValueError)
+
+            spool.enqueue(pow, (3, 2))
+            assert spool.finish(resume=True) == [9]
+
+    def test_process_stats(self):
+        with ProcessSpool(2, "process_stats", chunksize=16) as spool:
+            for i in range(0, 64):
+                spool.enqueue(time.sleep, (0.005,))
+
+        # Jobs in a chunk run one at a time, so each is timed on its own
+        stats = spool.stats()
+        assert stats["finished"] == 64
+        assert 0.005 <= stats["mean_run_time"] < 0.05
+        assert 0 < stats["utilization"] <= 1
+
+    def test_rate(self):
+        work = []
+        start = time.monotonic()
+        with Spool(8, "rate", rate=20, burst=5) as spool:
+            for i in range(0, 25):
+                spool.enqueue(work.append, (i,))
+
+        # 5 jobs start immediately, the other 20 at 20 per second
+        assert time.monotonic() - start >= 0.9
+        assert len(work) == 25
+
+    def test_order(self):
+        for order, expected in [("fifo", [0, 1, 2, 3]), ("lifo", [3, 2, 1, 0])]:
+            work = []
+            with Spool(1, order, belay=True, order=order) as spool:
+                for i in range(0, 4):
+                    spool.enqueue(work.append, (i,))
+            assert work == expected
+
+        work = []
+        with Spool(1, "priority", belay=True, order="fifo") as spool:
+            futures = [spool.enqueue(work.append, (i,), priority=i % 2) for i in range(0, 6)]
+            spool.reprioritize(futures[5], -1)
+            assert spool.drop(futures[2])
+        assert work == [5, 0, 4, 1, 3]
+
+    def test_stats(self):
+        started, finished = [], []
+        with Spool(4, "stats", on_start=started.append, on_finish=finished.append) as spool:
+            for i in range(0, 20):
+                spool.enqueue(dowork, ([], i), {"delay": 0.01})
+            spool.enqueue(int, ("nan",))
+
+        stats = spool.stats()
+        assert stats["enqueued"] == stats["started"] == stats["finished"] == 21
+        assert stats["failed"] == 1
+        assert stats["mean_run_time"] > 0
+        assert 0 < stats["utilization"] <= 1
+        assert len(started) == len(finished) == 21
+        assert all(job.run_time >= 0 and job.wait_time >= 0 for job in finished)
+
+    def test_autoscale(self):
+        quotas = set()
+        with Spool(1, "autoscale", autoscale=True, max_quota=16, autoscale_interval=0.1) as spool:
+            for i in range(0, 400):
+                spool.enqueue(dowork, ([], i), {"delay": 0.01})
+            while spool.numQueued:
+                quotas.add(spool.quota)
+                time.sleep(0.05)
+
+        assert max(quotas) > 1
+        assert max(quotas) <= 16
+
     def test_print(self):
         with Spool(8, "print bar") as spool:
             for i in range(0, 20):
@@ -43,6 +162,88 @@ class TestData(object):
             for i in range(0, 20):
                 spool.enqueue(dowork, ([], 1, f"Saying {i}"))
 
+    def test_aio_feed(self):
+        work = []
+
+        async def jobs(max):
+            for i in range(0, max):
+                yield lambda i=i: asleep(work, i)
+
+        async def main():
+            async with AIOSpool(3, jobs(20), "aio feed", use_progbar=False) as spool:
+                spool.feed(asleep(work, i) for i in range(20, 30))
+                spool.enqueue(asleep, (work, 30))
+
+        asyncio.run(main())
+        assert sorted(work) == list(range(0, 31))
+
+    def test_aio_backpressure(self):
+        work = []
+
+        async def main():
+            async with AIOSpool(2, name="aio bounded", max_queued=4, use_progbar=False) as spool:
+                for i in range(0, 40):
+                    await spool.aenqueue(asleep, (work, i))
+                    assert len(spool.queue) <= 4
+                while len(spool.queue) < 4:
+                    spool.enqueue(asleep, (work, None))
+                with pytest.raises(asyncio.QueueFull):
+                    spool.enqueue(asleep, (work, None))
+
+        asyncio.run(main())
+        assert sorted(i for i in work if i is not None) == list(range(0, 40))
+
+    def test_aio_rate(self):
+        work = []
+
+        async def main():
+            async with AIOSpool(8, name="aio rate", rate=20, burst=5, use_progbar=False) as spool:
+                for i in range(0, 25):
+                    spool.enqueue(asleep, (work, i, 0))
+
+        start = time.monotonic()
+        asyncio.run(main())
+        # 5 jobs start immediately, the other 20 at 20 per second
+        assert time.monotonic() - start >= 0.9
+        assert len(work) == 25
+
+    def test_aio_priority(self):
+        work = []
+
+        async def main():
+            # One worker, which only starts once we await
+            async with AIOSpool(1, name="aio priority", order="fifo", use_progbar=False) as spool:
+                handles = [spool.enqueue(asleep, (work, i, 0)) for i in range(0, 5)]
+                spool.enqueue(asleep, (work, 5, 0), priority=-1)
+                assert spool.reprioritize(handles[3], -2)
+                assert spool.drop(handles[1])
+            assert not spool.drop(handles[0])
+            assert not spool.reprioritize(handles[0], 0)
+
+        asyncio.run(main())
+        assert work == [3, 5, 0, 2, 4]
+
+    def test_aio_stats(self):
+        started, finished = [], []
+
+        async def fail():
+            raise ValueError()
+
+        async def main():
+            async with AIOSpool(4, name="aio stats", on_start=started.append, on_finish=finished.append, use_progbar=False) as spool:
+                for i in range(0, 20):
+                    spool.enqueue(asleep, ([], i))
+                spool.enqueue(fail)
+            return spool.stats()
+
+        stats = asyncio.run(main())
+        assert stats["enqueued"] == stats["started"] == stats["finished"] == 21
+        assert stats["failed"] == 1
+        assert stats["mean_run_time"] > 0
+        assert 0 < stats["utilization"] <= 1
+        assert len(started) == len(finished) == 21
+        assert [type(job.exception) for job in finished].count(ValueError) == 1
+
 
 class ATestData(object):
 
@@ -66,6 +267,18 @@ class ATestData(object):
             for i in range(0, 20):
                 spool.enqueue(adowork([], 1, f"Saying {i}"))
 
+    async def test_feed(self):
+        work = []
+
+        async def jobs(max):
+            for i in range(0, max):
+                yield lambda i=i: adowork(work, i)
+
+        async with AIOSpool(3, jobs(20), "feed") as spool:
+            spool.enqueue(adowork, (work, 20))
+
+        assert sorted(work) == list(range(0, 21))
+
     async def test_recurse(self):
         async def moreJobs(spool, prefix):
             for i in range(0, 5):
@@ -84,11 +297,16 @@ async def adowork(work, i, say=None):
     if say:
         print(say)
 
+async def asleep(work, i, delay=0.01):
+    await asyncio.sleep(delay)
+    work.append(i)
+
 async def asynciomain():
     orig_out, orig_out_err = sys.stdout, sys.stderr
     await ATestData().test_recurse()
     await ATestData().test_print()
     await ATestData().test_slow()
+    await ATestData().test_feed()
     await AIOSpool(jobs=[adowork([], 1, f"Saying hi")]).finish()
     assert orig_out is sys.stdout
     assert orig_out_err is sys.stderr
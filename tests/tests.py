@@ -1,5 +1,7 @@
 import pytest
 import os
+import shutil
+import hashlib
 
 from snip import *
 
@@ -79,6 +81,507 @@ class TestData(object):
         ], "tests/table_mismatch.csv")
 
 
+class TestHash(object):
+
+    def test_hashfile(self, tmp_path):
+        blob = os.urandom(100000)
+        path = tmp_path / "blob"
+        path.write_bytes(blob)
+
+        digests = hash.hashfile(path, ("crc32", "md5", "sha256"), bufsize=4096)
+        assert digests["crc32"] == hash.CRC32data(blob)
+        assert digests["md5"] == hash.md5data(blob)
+        assert digests["sha256"] == hashlib.sha256(blob).hexdigest()
+
+        assert hash.CRC32file(path) == hash.CRC32data(blob)
+        assert hash.md5file(path, bufsize=7) == hash.md5data(blob)
+
+    def test_mmap(self, tmp_path):
+        blob = os.urandom(100000)
+        path = tmp_path / "blob"
+        path.write_bytes(blob)
+        assert hash.hashfile(path, use_mmap=True, bufsize=4096) == hash.hashfile(path)
+
+        empty = tmp_path / "empty"
+        empty.write_bytes(b"")
+        assert hash.CRC32file(empty, use_mmap=True) == hash.CRC32data(b"")
+
+    def test_cache(self, tmp_path):
+        path = tmp_path / "blob"
+        path.write_bytes(b"old data")
+        os.utime(path, (1, 1))
+
+        with hash.HashCache(str(tmp_path / "cache.sqlite3"), max_entries=2, commit_every=1) as cache:
+            assert hash.CRC32file(path, cache=cache) == hash.CRC32data(b"old data")
+            assert len(cache) == 1
+            st = os.stat(path)
+            assert cache.lookup(path, st, ["crc32", "md5"]) == {"crc32": hash.CRC32data(b"old data")}
+
+            # Same size, but the new mtime invalidates the cached digest
+            path.write_bytes(b"new data")
+            os.utime(path, (2, 2))
+            assert cache.lookup(path, os.stat(path), ["crc32"]) == {}
+            assert hash.CRC32file(path, cache=cache) == hash.CRC32data(b"new data")
+
+            hash.hashfile(path, ("md5", "sha1"), cache=cache)
+            assert len(cache) == 2
+
+        with hash.HashCache(str(tmp_path / "cache.sqlite3")) as cache:
+            assert cache.lookup(path, os.stat(path), ["md5"]) == {"md5": hash.md5data(b"new data")}
+
+            # Lookups don't lock out other users of the same cache
+            with hash.HashCache(str(tmp_path / "cache.sqlite3"), commit_every=1) as other:
+                other.invalidate(path)
+            assert cache.lookup(path, os.stat(path), ["md5"]) == {}
+
+    def test_hashfiles(self, tmp_path):
+        blobs = {}
+        (tmp_path / "sub").mkdir()
+        for i in range(20):
+            path = tmp_path / ("sub" if i % 2 else ".") / f"file{i}"
+            blobs[os.path.normpath(path)] = os.urandom(i * 100)
+            path.write_bytes(blobs[os.path.normpath(path)])
+
+        digests = {os.path.normpath(path): digest for path, digest in hash.hashfiles(str(tmp_path), workers=4)}
+        assert digests == {path: hash.md5data(blob) for path, blob in blobs.items()}
+
+        digests = dict(hash.hashfiles(list(blobs), ("crc32", "md5"), workers=2))
+        assert all(digests[path]["crc32"] == hash.CRC32data(blob) for path, blob in blobs.items())
+
+    def test_findDuplicates(self, tmp_path):
+        big = os.urandom(10000)
+        # Same size, head, middle and tail as `big`, but not the same file
+        decoy = big[:2000] + os.urandom(1000) + big[3000:]
+        contents = {"a": big, "b": big, "c": decoy, "d": b"small", "e": b"small", "f": b"other"}
+        for name, blob in contents.items():
+            (tmp_path / name).write_bytes(blob)
+
+        assert hash.fingerprint(tmp_path / "a", blocksize=1000) == hash.fingerprint(tmp_path / "c", blocksize=1000)
+        groups = hash.findDuplicates(str(tmp_path), blocksize=1000, algorithm="md5")
+        assert sorted(sorted(os.path.basename(path) for path in group) for group in groups) == [["a", "b"], ["d", "e"]]
+
+    @pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs named pipes")
+    def test_mmap_pipe(self, tmp_path):
+        import threading
+        pipe = tmp_path / "pipe"
+        os.mkfifo(pipe)
+        writer = threading.Thread(target=pipe.write_bytes, args=(b"piped data",))
+        writer.start()
+        assert hash.md5file(pipe, use_mmap=True) == hash.md5data(b"piped data")
+        writer.join()
+
+
+class TestTrash(object):
+
+    def test_batches(self, tmp_path):
+        paths = [str(tmp_path / f"file{i}") for i in range(1000)]
+        for path in paths:
+            open(path, "w").close()
+
+        import threading
+        batches = []
+        # Hold up the OS trash, so commits pile up behind the first batch
+        release = threading.Event()
+        with filesystem.Trash(queue_size=100, batch_size=50) as trash:
+            trash._osTrash = lambda batch: release.wait() and (batches.append(batch) or filesystem._unlinkAll(batch))
+            for path in paths:
+                assert trash.delete(path)
+                assert not trash.isfile(path)
+            assert not trash.delete(paths[-1])
+            assert len(trash) == 100
+            assert trash.undo() == os.path.normpath(paths[-1])
+            committed = trash.trash_queue[50]
+            trash.commitDelete(committed)
+            assert len(trash.trash_queue) == 98
+            # Waiting for a full batch, but already on its way out
+            assert not trash.isfile(committed.path)
+            assert not trash.delete(committed.path)
+            release.set()
+            trash.sync()
+            assert not any(os.path.exists(path) for path in paths[:900])
+
+        assert [os.path.isfile(path) for path in paths[900:]].count(True) == 1
+        assert max(len(batch) for batch in batches) == 50
+
+    def test_idle_commit(self, tmp_path):
+        import time
+        paths = [str(tmp_path / f"file{i}") for i in range(10)]
+        for path in paths:
+            open(path, "w").close()
+
+        # Overflowing deletes go out without waiting for a full batch
+        with filesystem.Trash(queue_size=2) as trash:
+            trash._osTrash = filesystem._unlinkAll
+            for path in paths:
+                trash.delete(path)
+            for i in range(100):
+                if not any(os.path.exists(path) for path in paths[:8]):
+                    break
+                time.sleep(0.01)
+            assert [os.path.exists(path) for path in paths] == [False] * 8 + [True] * 2
+
+    def test_partial_batch(self, tmp_path, caplog):
+        paths = [str(tmp_path / f"file{i}") for i in range(4)]
+        for path in paths:
+            open(path, "w").close()
+
+        def osTrash(batch):
+            # Like send2trash, stop at the first path that can't be trashed
+            for path in batch:
+                if path == paths[2]:
+                    raise PermissionError(path)
+                os.unlink(path)
+
+        with filesystem.Trash(queue_size=10) as trash:
+            trash._osTrash = osTrash
+            for path in paths:
+                trash.delete(path)
+
+        assert [os.path.exists(path) for path in paths] == [False, False, True, False]
+        errors = [record.getMessage() for record in caplog.records if record.levelname == "ERROR"]
+        assert errors == [f"Couldn't trash '{paths[2]}'"]
+
+
+    @pytest.mark.parametrize("verify", ["stat", "sample", "crc"])
+    def test_verify(self, tmp_path, verify):
+        kept, gone = str(tmp_path / "kept"), str(tmp_path / "gone")
+        for path in (kept, gone):
+            with open(path, "w") as fp:
+                fp.write("original")
+
+        with filesystem.Trash(queue_size=10, verify=verify) as trash:
+            trash._osTrash = filesystem._unlinkAll
+            trash.delete(kept)
+            trash.delete(gone)
+            with open(kept, "w") as fp:
+                fp.write("changed!")
+            os.utime(kept, ns=(0, 0))
+
+        assert os.path.isfile(kept)
+        assert not os.path.exists(gone)
+
+
+    def test_journal(self, tmp_path):
+        journal = str(tmp_path / "trash.journal")
+        paths = [str(tmp_path / f"file{i}.{'txt' if i % 2 else 'png'}") for i in range(6)]
+        for path in paths:
+            open(path, "w").close()
+
+        # Abandoned without finishing, as if we crashed
+        trash = filesystem.Trash(queue_size=10, journal=journal)
+        for path in paths:
+            trash.delete(path, rename=True)
+        assert trash.undo() == paths[-1]
+        with open(journal, "a") as fp:
+            fp.write('{"op": "trash", "ent')
+        trash._spool.finish()
+
+        # Entries are checked with the verify mode they were trashed with
+        with filesystem.Trash(queue_size=10, journal=journal, verify="sample") as trash:
+            trash._osTrash = filesystem._unlinkAll
+            assert len(trash) == 5
+            assert not any(os.path.exists(path) for path in paths[:-1])
+            assert trash.restore("*.txt") == [paths[1], paths[3]]
+            assert trash.undo(2) == [paths[4], paths[2]]
+            assert len(trash) == 1
+
+        assert [os.path.exists(path) for path in paths] == [False, True, True, True, True, True]
+        assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(path) for path in paths[1:])
+
+
+    def test_journal_portable(self, tmp_path, monkeypatch):
+        journal, path = str(tmp_path / "trash.journal"), str(tmp_path / "file")
+        with open(path, "w") as fp:
+            fp.write("data")
+
+        trash = filesystem.Trash(journal=journal, verify="sample")
+        trash.delete(path, rename=True)
+        trash._spool.finish()
+
+        # Replayed where a different fast hash is available
+        monkeypatch.setattr(hash, "fastAlgorithm", lambda: "md5")
+        with filesystem.Trash(journal=journal, verify="sample") as trash:
+            trash._osTrash = filesystem._unlinkAll
+        assert os.listdir(tmp_path) == []
+
+
+class TestTransfer(object):
+
+    def makeTree(self, root):
+        os.makedirs(os.path.join(root, "sub", "deeper"))
+        for name in ("a", os.path.join("sub", "b"), os.path.join("sub", "deeper", "c")):
+            with open(os.path.join(root, name), "w") as fp:
+                fp.write(name)
+
+    def listTree(self, root):
+        return sorted(
+            os.path.relpath(os.path.join(dirpath, name), root)
+            for dirpath, dirnames, filenames in os.walk(root) for name in filenames
+        )
+
+    def test_copy(self, tmp_path):
+        src, dst = str(tmp_path / "src"), str(tmp_path / "dst")
+        self.makeTree(src)
+        copied = filesystem.copyDirWithMerge(src, dst, quiet=True)
+        assert sorted(os.path.relpath(path, dst) for path in copied) == self.listTree(src) == self.listTree(dst)
+
+        # Merge into the existing copy, with a thread per file
+        with open(os.path.join(src, "sub", "b"), "w") as fp:
+            fp.write("changed")
+        filesystem.transferTree(src, dst, workers=3, quiet=True)
+        with open(os.path.join(dst, "sub", "b")) as fp:
+            assert fp.read() == "changed"
+
+        # Missing parent directories are created, for copies and moves alike
+        nested = str(tmp_path / "new" / "parent")
+        filesystem.copyDirWithMerge(dst, os.path.join(nested, "copied"), quiet=True)
+        filesystem.moveDirWithMerge(os.path.join(nested, "copied"), os.path.join(nested, "more", "moved"), quiet=True)
+        assert self.listTree(os.path.join(nested, "more", "moved")) == self.listTree(dst)
+
+        # A symlink replaces the file it's merged over
+        os.unlink(os.path.join(src, "a"))
+        os.symlink("sub", os.path.join(src, "a"))
+        filesystem.transferTree(src, dst, quiet=True)
+        assert os.readlink(os.path.join(dst, "a")) == "sub"
+
+    def test_copyFile(self, tmp_path):
+        blob = os.urandom(3 * 1024 * 1024 + 5)
+        src = tmp_path / "src"
+        src.write_bytes(blob)
+        os.utime(src, (1000, 1000))
+        (tmp_path / "dir").mkdir()
+
+        filesystem.copyFileToDir(str(src), str(tmp_path / "dir"), quiet=True)
+        filesystem.copyFileToFile(str(src), str(tmp_path / "copy"), quiet=True)
+        for copy in (tmp_path / "dir" / "src", tmp_path / "copy"):
+            assert copy.read_bytes() == blob
+            assert os.stat(copy).st_mtime == 1000
+
+        with pytest.raises(shutil.SameFileError):
+            filesystem.copyFileToDir(str(src), str(tmp_path), clobber=True, quiet=True)
+        assert src.read_bytes() == blob
+
+        # Every fallback produces the same file
+        for method in filesystem._COPY_METHODS:
+            dst = tmp_path / method.__name__
+            try:
+                with open(src, "rb") as a, open(dst, "wb") as b:
+                    method(a.fileno(), b.fileno(), len(blob))
+            except OSError:
+                continue
+            assert dst.read_bytes() == blob
+
+    def test_filesToDir(self, tmp_path):
+        (tmp_path / "dst").mkdir()
+        sources = []
+        for i in range(20):
+            path = tmp_path / f"file{i}"
+            path.write_text(str(i))
+            sources.append(str(path))
+        (tmp_path / "dst" / "file19").write_text("in the way")
+
+        with pytest.raises(FileExistsError):
+            filesystem.moveFilesToDir(sources, str(tmp_path / "dst"), quiet=True)
+        # Nothing moved if any check fails
+        assert all(os.path.isfile(path) for path in sources)
+
+        moved = filesystem.moveFilesToDir(sources[:10], str(tmp_path / "dst"), quiet=True, workers=4)
+        copied = filesystem.copyFilesToDir(sources[10:], str(tmp_path / "dst"), clobber=True, quiet=True)
+        assert [os.path.basename(path) for path in moved + copied] == [os.path.basename(path) for path in sources]
+        assert not any(os.path.exists(path) for path in sources[:10])
+        assert (tmp_path / "dst" / "file19").read_text() == "19"
+
+    def test_move(self, tmp_path):
+        src, dst = str(tmp_path / "src"), str(tmp_path / "dst")
+        self.makeTree(src)
+        expected = self.listTree(src)
+        filesystem.moveDirWithMerge(src, dst, quiet=True)
+        assert not os.path.exists(src)
+        assert self.listTree(dst) == expected
+
+        # Merge into an existing directory
+        self.makeTree(src)
+        with open(os.path.join(dst, "extra"), "w") as fp:
+            fp.write("extra")
+        filesystem.moveDirWithMerge(src, dst, clobber=True, quiet=True)
+        assert not os.path.exists(src)
+        assert self.listTree(dst) == sorted(expected + ["extra"])
+
+
+class TestScan(object):
+
+    def test_scanTree(self, tmp_path):
+        for relpath in ("a.txt", "b.png", "sub/c.txt", "sub/deeper/d.txt", "skip/e.txt"):
+            (tmp_path / relpath).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / relpath).write_text(relpath)
+        os.symlink(tmp_path / "sub", tmp_path / "link")
+
+        def scan(**kwargs):
+            return sorted(entry.relpath for entry in filesystem.scanTree(str(tmp_path), **kwargs))
+
+        assert scan(include="*.txt", exclude="skip") == ["a.txt", "sub/c.txt", "sub/deeper/d.txt"]
+        assert scan(include="*.txt", exclude="skip", workers=4) == ["a.txt", "sub/c.txt", "sub/deeper/d.txt"]
+        assert scan(max_depth=0) == ["a.txt", "b.png", "link", "skip", "sub"]
+        assert scan(include="sub/d*") == ["sub/deeper", "sub/deeper/d.txt"]
+        # Followed links are still only visited once
+        assert len(scan(include="c.txt", follow_symlinks=True)) == 1
+
+        entry = next(filesystem.scanTree(str(tmp_path), include="a.txt"))
+        assert entry.stat.st_size == 5 and not entry.is_dir and entry.depth == 0
+
+
+class TestTreeIndex(object):
+
+    def test_diff(self, tmp_path):
+        root = tmp_path / "root"
+
+        def age():
+            # Make everything look old enough for the index to trust directory mtimes.
+            for dirpath, dirnames, filenames in os.walk(root):
+                os.utime(dirpath, (1, 1))
+
+        for relpath in ("keep", "change", "remove", "rename", "sub/copy"):
+            (root / relpath).parent.mkdir(parents=True, exist_ok=True)
+            (root / relpath).write_text(relpath)
+        age()
+
+        index = filesystem.TreeIndex(str(root), digest="md5")
+        diff = index.scan()
+        assert diff.added == ["change", "keep", "remove", "rename", "sub/copy"]
+        assert index.files["keep"].digest == hash.md5data(b"keep")
+
+        (root / "change").write_text("changed")
+        age()
+        (root / "remove").unlink()
+        (root / "rename").rename(root / "renamed")
+        (root / "copied").write_text("sub/copy")
+        (root / "sub" / "copy").unlink()
+        (root / "new").write_text("new")
+
+        index.save(str(tmp_path / "index.json"))
+        index = filesystem.TreeIndex.load(str(tmp_path / "index.json"))
+        diff = index.scan()
+        assert diff == filesystem.TreeDiff(
+            added=["new"], removed=["remove"], modified=["change"],
+            moved=[("rename", "renamed"), ("sub/copy", "copied")]
+        )
+        assert index.scan() == filesystem.TreeDiff([], [], [], [])
+
+        # A new file of the same size that reuses a deleted file's inode isn't a move
+        index = filesystem.TreeIndex(str(root))
+        index.scan()
+        (root / "new").unlink()
+        (root / "other").write_text("old")
+        os.utime(root / "other", (5, 5))
+        # The filesystem may or may not have reused it; pretend it did
+        index.files["new"] = index.files["new"]._replace(inode=os.stat(root / "other").st_ino)
+        assert index.scan() == filesystem.TreeDiff(["other"], ["new"], [], [])
+
+        # Without checking files, in-place changes in unchanged directories go unseen
+        age()
+        index.scan()
+        (root / "keep").write_text("kept!")
+        age()
+        assert index.scan(check_files=False).modified == []
+        assert index.scan().modified == ["keep"]
+
+
+class TestWatcher(object):
+
+    @pytest.mark.parametrize("use_inotify", [None, False])
+    def test_events(self, tmp_path, use_inotify):
+        import time
+        root = str(tmp_path / "watched")
+        os.mkdir(root)
+        with open(os.path.join(root, "old"), "w") as fp:
+            fp.write("old")
+
+        events = []
+
+        def waitFor(*expected):
+            for i in range(60):
+                if all(event in events for event in expected):
+                    return
+                time.sleep(0.05)
+            assert False, events
+
+        with filesystem.Watcher(root, events.extend, debounce=0.2, poll_interval=0.1, use_inotify=use_inotify):
+            with open(os.path.join(root, "new"), "w") as fp:
+                fp.write("new")
+                fp.flush()
+                fp.write("er")
+            os.rename(os.path.join(root, "old"), os.path.join(root, "renamed"))
+            waitFor(
+                filesystem.WatchEvent("created", os.path.join(root, "new")),
+                filesystem.WatchEvent("moved", os.path.join(root, "old"), os.path.join(root, "renamed"))
+            )
+            os.unlink(os.path.join(root, "new"))
+            waitFor(filesystem.WatchEvent("deleted", os.path.join(root, "new")))
+            # Moved out of the tree, so there's no other half of the move to wait for
+            os.rename(os.path.join(root, "renamed"), str(tmp_path / "outside"))
+            waitFor(filesystem.WatchEvent("deleted", os.path.join(root, "renamed")))
+
+        # Coalesced: nothing but created, moved, deleted, deleted
+        assert len(events) == 4
+
+        # Watchers can be restarted, on the same backend
+        watcher = filesystem.Watcher(root, events.extend, debounce=0.2, poll_interval=0.1, use_inotify=use_inotify)
+        backend = watcher.backend
+        with watcher:
+            pass
+        with watcher:
+            assert watcher.backend == backend
+            assert (watcher._inotify is not None) == (backend == "inotify")
+            with open(os.path.join(root, "again"), "w") as fp:
+                fp.write("again")
+            waitFor(filesystem.WatchEvent("created", os.path.join(root, "again")))
+
+
+class TestJfileutil(object):
+
+    def test_atomic_save(self, tmp_path):
+        from snip import jfileutil
+        basepath = str(tmp_path)
+        jfileutil.json_save({"version": 1}, "data", basepath=basepath)
+        jfileutil.json_save({"version": 2}, "data", basepath=basepath, fsync_dir=True)
+
+        json_path = jfileutil.get_json_path(basepath, "data")
+        assert jfileutil.json_load("data", basepath=basepath) == {"version": 2}
+        with open(json_path + ".bak") as fp:
+            assert fp.read() == '{\n    "version": 1\n}'
+        assert sorted(os.listdir(tmp_path)) == ["data.json", "data.json.bak"]
+
+        # Saved files get the usual permissions, and keep any they were given
+        umask = os.umask(0o022)
+        try:
+            os.unlink(json_path)
+            jfileutil.json_save({"version": 2}, "data", basepath=basepath)
+            assert os.stat(json_path).st_mode & 0o777 == 0o644
+            os.chmod(json_path, 0o600)
+            jfileutil.json_save({"version": 2}, "data", basepath=basepath)
+            assert os.stat(json_path).st_mode & 0o777 == 0o600
+        finally:
+            os.umask(umask)
+
+        # Backups are links, not copies
+        with jfileutil.RotatingHandler("data", basepath=basepath) as obj:
+            obj["version"] = 3
+        assert os.stat(json_path + ".bak").st_ino != os.stat(json_path).st_ino
+        assert jfileutil.json_load("data", basepath=basepath) == {"version": 3}
+        jfileutil.link_backup(json_path, json_path + ".bak")
+        assert os.stat(json_path + ".bak").st_ino == os.stat(json_path).st_ino
+
+        # Non-atomic saves displace the file, even when the backup is linked to it
+        jfileutil.json_save({"version": 4}, "data", basepath=basepath, atomic=False)
+        assert jfileutil.json_load("data", basepath=basepath) == {"version": 4}
+        with open(json_path + ".bak") as fp:
+            assert fp.read() == '{\n    "version": 3\n}'
+
+        with pytest.raises(TypeError):
+            jfileutil.json_save({"bad": object()}, "data", basepath=basepath)
+        assert jfileutil.json_load("data", basepath=basepath) == {"version": 4}
+
+
 class TestNest(object):
 
     def test_basic(self):
@@ -16,8 +16,8 @@ with Trash(queue_size=queue_size, verbose=True) as trash:
     print(trash)
     print([f for f in glob.glob("test*.txt") if trash.isfile(f)])
     print(glob.glob("test*.txt"))
-    trash.spool.finish(resume=True)
-    assert glob.glob("test*.txt") == [f"test{i}.txt" for i in range(2, 10)]
+    trash.sync()
+    assert sorted(glob.glob("test*.txt")) == [f"test{i}.txt" for i in range(2, 10)]
 
 for i in range(0, 10):
     try: